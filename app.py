@@ -1,30 +1,72 @@
 from flask import Flask, render_template, request, redirect, url_for, jsonify, Response
-from functools import wraps
+from markupsafe import escape
+from functools import lru_cache, wraps
 import json
+import logging
 import os
 import uuid
 import base64
+import gzip
+import hashlib
+import queue
+import random
+import zlib
 import threading
 import time
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from io import BytesIO
+from types import MappingProxyType
 
 # Database imports
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 
 # Gemini API
 from google import genai
 from google.genai import types
 
 # Resend for email
+import httpx
 import resend
+from resend.exceptions import ResendError
 
 # Anthropic (Claude) API
 import anthropic
 
 app = Flask(__name__)
 
+# Progress messages are DEBUG; production runs at LOG_LEVEL=INFO so they are
+# skipped before any formatting happens.
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+# Bounded pools for background generation: bursts queue up instead of spawning
+# unbounded threads. Avatars and plans get separate pools so slow Gemini
+# retries can't hold up plan generation (which is often a cache hit).
+AVATAR_WORKERS = int(os.environ.get('AVATAR_WORKERS', '8'))
+PLAN_WORKERS = int(os.environ.get('PLAN_WORKERS', '4'))
+AVATAR_EXECUTOR = ThreadPoolExecutor(max_workers=AVATAR_WORKERS, thread_name_prefix='avatar')
+PLAN_EXECUTOR = ThreadPoolExecutor(max_workers=PLAN_WORKERS, thread_name_prefix='plan')
+
+
+def _log_job_failure(future):
+    """Log exceptions that escaped a background job instead of dropping them with the Future."""
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Background job failed", exc_info=exc)
+
+
+def run_in_background(executor, fn, *args):
+    """Queue fn(*args) on the given pool and return its Future."""
+    future = executor.submit(fn, *args)
+    future.add_done_callback(_log_job_failure)
+    return future
+
 # Database connection
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
@@ -55,9 +97,179 @@ def require_admin(f):
     return decorated
 
 
+class TokenBucket:
+    """Blocking token-bucket rate limiter shared by the threads of this process.
+
+    Callers that exceed the rate wait for a token instead of hitting the
+    provider and getting a 429.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Outbound API rate limits (requests per second, per process)
+claude_rate_limit = TokenBucket(float(os.environ.get('CLAUDE_RATE_LIMIT', '10')))
+resend_rate_limit = TokenBucket(float(os.environ.get('RESEND_RATE_LIMIT', '14')))
+gemini_rate_limit = TokenBucket(float(os.environ.get('GEMINI_RATE_LIMIT', '5')))
+
+
+class PooledResendClient(resend.HTTPClient):
+    """Resend transport that reuses keep-alive connections across sends.
+
+    The SDK's default client goes through requests.request(), which opens a
+    new TLS connection to api.resend.com for every email. Failed connection
+    attempts are retried; a request that reached Resend never is, so an
+    email cannot be sent twice.
+    """
+
+    def __init__(self, timeout=30, retries=2):
+        self._client = httpx.Client(
+            timeout=timeout,
+            transport=httpx.HTTPTransport(
+                retries=retries,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            ),
+        )
+
+    def request(self, method, url, headers, json=None, files=None, data=None):
+        resend_rate_limit.acquire()
+        try:
+            resp = self._client.request(method, url, headers=headers,
+                                        json=json if data is None else None,
+                                        data=data, files=files)
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Request failed: {e}") from e
+        return resp.content, resp.status_code, resp.headers
+
+
 # Initialize Resend
 if RESEND_API_KEY:
     resend.api_key = RESEND_API_KEY
+resend.default_http_client = PooledResendClient()
+
+# Outbound email batching: attachment-free emails sent within the window are
+# combined into one Resend batch request (set EMAIL_BATCH_WINDOW_MS=0 to disable).
+EMAIL_BATCH_SIZE = 50
+EMAIL_BATCH_WINDOW = int(os.environ.get('EMAIL_BATCH_WINDOW_MS', '500')) / 1000
+
+
+# Resend status codes that mean the batch was refused as invalid (nothing sent)
+BATCH_REJECTION_CODES = frozenset({'400', '422'})
+
+
+class EmailBatcher:
+    """Collects emails from worker threads and sends them via Resend's batch endpoint.
+
+    Callers get a Future that resolves once the batch containing their email
+    has been sent. Resend's batch API does not accept attachments, so only
+    attachment-free emails should be submitted here. If the batch request is
+    rejected as invalid (400/422), each email is retried on its own so one bad
+    recipient cannot fail the others. Any other failure may have been accepted
+    by Resend, so it fails the whole batch rather than risk duplicates.
+    """
+
+    _STOP = object()
+
+    def __init__(self, max_size, window):
+        self.max_size = max_size
+        self.window = window
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, email_params):
+        future = Future()
+        self._queue.put((email_params, future))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='email-batcher', daemon=True)
+                self._thread.start()
+        return future
+
+    def close(self, timeout=None):
+        """Send anything still queued and stop the flush thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(self._STOP)
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._send(batch)
+            if stopping:
+                return
+
+    def _send(self, batch):
+        if len(batch) > 1:
+            try:
+                resend.Batch.send([email_params for email_params, _ in batch])
+            except ResendError as e:
+                if str(e.code) not in BATCH_REJECTION_CODES:
+                    self._fail(batch, e)
+                    return
+                logger.warning("[EMAIL] Batch of %s rejected (%s), sending individually", len(batch), e)
+            except Exception as e:
+                # Timeouts, resets and 5xx may have been accepted: resending
+                # could deliver every email twice, so let callers release instead
+                self._fail(batch, e)
+                return
+            else:
+                logger.info("[EMAIL] Sent batch of %s email(s)", len(batch))
+                for _, future in batch:
+                    future.set_result(None)
+                return
+
+        for email_params, future in batch:
+            try:
+                resend.Emails.send(email_params)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+    def _fail(self, batch, exc):
+        logger.warning("[EMAIL] Batch of %s failed: %s", len(batch), exc)
+        for _, future in batch:
+            future.set_exception(exc)
+
+
+_email_batcher = EmailBatcher(EMAIL_BATCH_SIZE, EMAIL_BATCH_WINDOW)
 
 # Claude API client (lazy initialization)
 _claude_client = None
@@ -71,11 +283,32 @@ def get_claude_client():
         if api_key:
             _claude_client = anthropic.Anthropic(api_key=api_key)
         else:
-            print("Warning: ANTHROPIC_API_KEY not set, Claude features disabled")
+            logger.warning("ANTHROPIC_API_KEY not set, Claude features disabled")
     return _claude_client
 
-# Survey configuration
-SURVEY_CONFIG = {
+
+# Gemini API client (lazy initialization, shared across avatar jobs)
+_gemini_client = None
+
+
+def get_gemini_client():
+    """Get or create Gemini API client."""
+    global _gemini_client
+    if _gemini_client is None and GEMINI_API_KEY:
+        _gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+    return _gemini_client
+
+def _freeze(value):
+    """Recursively turn dicts into read-only mappings and lists into tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# Survey configuration (frozen: it is shared by every request and must never be mutated)
+SURVEY_CONFIG = _freeze({
     'title': 'Pre-Presentation Knowledge Assessment',
     'subtitle': 'LLMs and Vibe Coding',
     'intro': 'Please rate your current confidence level on each topic before the presentation.',
@@ -216,8 +449,70 @@ SURVEY_CONFIG = {
             'required': False
         }
     ]
+})
+
+
+# Id-indexed view of the survey questions, and the accepted values for every
+# question with a fixed option list ('Other' free text is allowed separately)
+SURVEY_QUESTIONS_BY_ID = MappingProxyType({q['id']: q for q in SURVEY_CONFIG['questions']})
+SURVEY_OPTION_VALUES = {
+    q['id']: frozenset(o['value'] if isinstance(o, Mapping) else o for o in q['options'])
+    for q in SURVEY_CONFIG['questions']
+    if 'options' in q and q['type'] != 'radio_with_other'
 }
 
+
+def _make_answer_reader(question):
+    """Build the function that reads one question's answer from the submitted form."""
+    qid = question['id']
+    allowed = SURVEY_OPTION_VALUES.get(qid)
+
+    if question['type'] == 'checkbox':
+        return lambda form: form.getlist(qid)
+
+    if question['type'] == 'radio_with_other':
+        other_field = f'{qid}_other_text'
+
+        def read_radio_with_other(form):
+            value = form.get(qid, '')
+            if value == '__other__':
+                # Use the custom text from the "Other" field
+                value = form.get(other_field, '').strip()
+            return value
+        return read_radio_with_other
+
+    if question['type'] == 'multi_select_exact':
+        expected_count = question.get('select_count', 3)
+
+        def read_multi_select_exact(form):
+            # A repeated pick counts once, so it can't stand in for a distinct one
+            values = list(dict.fromkeys(form.getlist(qid)))
+            # Validate exact count if provided
+            if values and len(values) != expected_count:
+                logger.warning("%s has %s items, expected %s", qid, len(values), expected_count)
+                values = []  # Clear invalid data
+            elif allowed is not None and not allowed.issuperset(values):
+                logger.warning("%s has unknown options %s", qid, values)
+                values = []
+            return values
+        return read_multi_select_exact
+
+    if allowed is not None:
+        def read_option(form):
+            value = form.get(qid, '')
+            return value if value in allowed else ''
+        return read_option
+
+    return lambda form: form.get(qid, '')
+
+
+# Per-question lookups derived once from SURVEY_CONFIG
+ANSWER_READERS = {q['id']: _make_answer_reader(q) for q in SURVEY_CONFIG['questions']}
+RATING_QUESTIONS = [q for q in SURVEY_CONFIG['questions'] if q['type'] == 'rating']
+MULTIPLE_CHOICE_QUESTIONS = [q for q in SURVEY_CONFIG['questions'] if q['type'] == 'multiple_choice']
+TEXT_QUESTION_IDS = [q['id'] for q in SURVEY_CONFIG['questions'] if q['type'] == 'textarea']
+COUNTED_QUESTION_IDS = [q['id'] for q in RATING_QUESTIONS + MULTIPLE_CHOICE_QUESTIONS]
+
 # Visual mappings for Claude avatar prompt generation
 UNIVERSE_VISUALS = {
     'scifi': 'sleek spacecraft, holograms, clean futuristic tech',
@@ -232,6 +527,20 @@ UNIVERSE_VISUALS = {
     'underwater': 'deep sea, bioluminescence, aquatic elements',
 }
 
+# Character archetypes that fit each universe
+UNIVERSE_ARCHETYPES = {
+    'scifi': 'space captain, starship pilot, or galactic explorer',
+    'fantasy': 'legendary hero, mystical ranger, or arcane mage',
+    'cyberpunk': 'netrunner, street samurai, or rogue hacker',
+    'retro': 'arcade champion, pixel warrior, or retro game hero',
+    'nature': 'forest guardian, elemental druid, or nature spirit',
+    'steampunk': 'airship captain, clockwork inventor, or brass-clad adventurer',
+    'cosmic': 'cosmic voyager, astral being, or starborn guardian',
+    'postapoc': 'wasteland survivor, road warrior, or resistance fighter',
+    'noir': 'hardboiled detective, shadow operative, or mystery solver',
+    'underwater': 'deep sea explorer, ocean guardian, or aquatic adventurer',
+}
+
 FUEL_VISUALS = {
     'gaming': 'controllers, headsets, game UI elements',
     'music': 'headphones, sound waves, instruments',
@@ -262,91 +571,213 @@ VIBE_PLAN_ERROR_MESSAGE = """We couldn't generate your personalized plan at this
 
 MAX_AVATARS_PER_EMAIL = 3
 
+# Browser/CDN cache lifetime for completed avatar pages (the page can still be
+# deleted from the admin, so it is not cached forever like the image)
+AVATAR_PAGE_MAX_AGE = 3600
+
+
+# Connections are reused across requests and background jobs; each gunicorn
+# worker process gets its own pool on first use (init_db uses its own one-off
+# connection, so importing app opens no pool for --preload workers to inherit). psycopg2 closes connections
+# returned beyond minconn, so the minimum covers everything that can hold one
+# at once: the request threads (WEB_THREADS, match gunicorn --threads) plus
+# both job pools.
+WEB_THREADS = int(os.environ.get('WEB_THREADS', '4'))
+PG_POOL_MIN = int(os.environ.get('PG_POOL_MIN', str(WEB_THREADS + AVATAR_WORKERS + PLAN_WORKERS)))
+PG_POOL_MAX = max(int(os.environ.get('PG_POOL_MAX', '20')), PG_POOL_MIN)
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
 
 def get_db():
-    """Get database connection."""
-    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-    return conn
+    """Get a database connection from the pool; use db_conn() rather than calling this directly."""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ThreadedConnectionPool(PG_POOL_MIN, PG_POOL_MAX, DATABASE_URL,
+                                                  cursor_factory=RealDictCursor)
+    return _db_pool.getconn()
+
+
+def release_db(conn):
+    """Return a connection from get_db() to the pool.
+
+    psycopg2 rolls back an idle-in-transaction connection it keeps, and
+    closes (rather than keeps) broken ones or any beyond PG_POOL_MIN.
+    """
+    if _db_pool is None:
+        conn.close()
+    else:
+        _db_pool.putconn(conn)
+
+
+@contextmanager
+def db_conn():
+    """Check a pooled connection out for the duration of a with block.
+
+    The connection always goes back to the pool, even if the block raises
+    (after rolling back), so errors can't leak checkouts until the pool
+    is exhausted. Callers still commit explicitly.
+    """
+    conn = get_db()
+    try:
+        yield conn
+    except Exception:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            pass  # connection is broken; putconn discards it
+        raise
+    finally:
+        release_db(conn)
 
 
 def init_db():
-    """Initialize database tables."""
+    """Initialize database tables.
+
+    Runs in every worker at import, so only additive, idempotent statements
+    belong here; type changes and column drops go in migrate_db.py. Uses a
+    one-off connection rather than the pool, which is created on first use
+    in the process that serves requests.
+    """
     if not DATABASE_URL:
-        print("Warning: DATABASE_URL not set, skipping database initialization")
+        logger.warning("DATABASE_URL not set, skipping database initialization")
         return
 
-    conn = get_db()
-    cur = conn.cursor()
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        cur = conn.cursor()
 
-    # Create responses table
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS responses (
-            id SERIAL PRIMARY KEY,
-            email VARCHAR(255),
-            data JSONB NOT NULL,
-            selfie_data TEXT,
-            submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+        # Create responses table
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                id SERIAL PRIMARY KEY,
+                email VARCHAR(255),
+                data JSONB NOT NULL,
+                submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                email_sent_at TIMESTAMP
+            )
+        ''')
+        cur.execute('ALTER TABLE responses ADD COLUMN IF NOT EXISTS email_sent_at TIMESTAMP')
 
-    # Create avatars table
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS avatars (
-            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-            email VARCHAR(255) NOT NULL,
-            response_id INTEGER REFERENCES responses(id),
-            image_data TEXT,
-            status VARCHAR(50) DEFAULT 'pending',
-            error_message TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            completed_at TIMESTAMP
-        )
-    ''')
+        # Create avatars table
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS avatars (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                email VARCHAR(255) NOT NULL,
+                response_id INTEGER REFERENCES responses(id),
+                image_data BYTEA,
+                status VARCHAR(50) DEFAULT 'pending',
+                error_message TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                completed_at TIMESTAMP
+            )
+        ''')
 
-    # Create vibe_plans table
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS vibe_plans (
-            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-            response_id INTEGER REFERENCES responses(id),
-            email VARCHAR(255) NOT NULL,
-            wishlist_input TEXT NOT NULL,
-            plan_content TEXT,
-            status VARCHAR(50) DEFAULT 'pending',
-            error_message TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            completed_at TIMESTAMP
-        )
-    ''')
+        # Create vibe_plans table
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS vibe_plans (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                response_id INTEGER REFERENCES responses(id),
+                email VARCHAR(255) NOT NULL,
+                wishlist_input TEXT NOT NULL,
+                plan_content TEXT,
+                status VARCHAR(50) DEFAULT 'pending',
+                error_message TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                completed_at TIMESTAMP
+            )
+        ''')
 
-    # Create index for email lookups
-    cur.execute('''
-        CREATE INDEX IF NOT EXISTS idx_avatars_email ON avatars(email)
-    ''')
+        # Create plan_cache table (generated plans keyed by normalized wishlist input)
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS plan_cache (
+                prompt_hash VARCHAR(64) PRIMARY KEY,
+                wishlist_input TEXT NOT NULL,
+                plan_content TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Create index for email lookups
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_avatars_email ON avatars(email)
+        ''')
 
-    conn.commit()
-    cur.close()
-    conn.close()
-    print("Database initialized successfully")
+        # Partial index for the admin "clear failed avatars" action
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_avatars_failed ON avatars(status) WHERE status = 'failed'
+        ''')
 
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+    logger.info("Database initialized successfully")
 
-def get_avatar_count(email):
-    """Get the number of avatars created for an email."""
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT COUNT(*) as count FROM avatars WHERE email = %s', (email,))
+
+def get_avatar_count(email, cur=None):
+    """Get the number of avatars created for an email, capped at MAX_AVATARS_PER_EMAIL.
+
+    Callers only compare against the cap, so the index scan stops there.
+    Pass cur to run the count on a connection the caller already holds.
+    """
+    if cur is None:
+        with db_conn() as conn:
+            cur = conn.cursor()
+            count = get_avatar_count(email, cur)
+            cur.close()
+        return count
+
+    cur.execute('''
+        SELECT COUNT(*) as count
+        FROM (SELECT 1 FROM avatars WHERE email = %s LIMIT %s) capped
+    ''', (email, MAX_AVATARS_PER_EMAIL))
     result = cur.fetchone()
-    cur.close()
-    conn.close()
     return result['count'] if result else 0
 
 
+# Short-lived per-process cache for the /check-email pre-check, which the
+# survey page calls while the user types. submit() always counts from the
+# database, so a stale entry can't let anyone past the limit.
+AVATAR_COUNT_TTL = 30
+_avatar_count_cache = {}
+_avatar_count_lock = threading.Lock()
+
+
+def get_cached_avatar_count(email):
+    """get_avatar_count() memoized for AVATAR_COUNT_TTL seconds."""
+    now = time.monotonic()
+    with _avatar_count_lock:
+        cached = _avatar_count_cache.get(email)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    count = get_avatar_count(email)
+    with _avatar_count_lock:
+        if len(_avatar_count_cache) >= 10000:
+            _avatar_count_cache.clear()
+        _avatar_count_cache[email] = (now + AVATAR_COUNT_TTL, count)
+    return count
+
+
+def invalidate_avatar_count(email=None):
+    """Drop the cached count for email, or every cached count when email is None."""
+    with _avatar_count_lock:
+        if email is None:
+            _avatar_count_cache.clear()
+        else:
+            _avatar_count_cache.pop(email, None)
+
+
 def generate_avatar_prompt(universe: str, fuels: list, element: str) -> str:
     """
     Generate a custom Gemini image prompt based on user preferences.
 
     Args:
         universe: Selected aesthetic universe (e.g., 'cyberpunk')
-        fuels: List of 3 interests (e.g., ['gaming', 'code', 'coffee'])
+        fuels: List of 2 interests (e.g., ['gaming', 'code'])
         element: Selected element (e.g., 'lightning')
 
     Returns:
@@ -359,15 +790,15 @@ def generate_avatar_prompt(universe: str, fuels: list, element: str) -> str:
         return FALLBACK_AVATAR_PROMPT
 
     if universe not in UNIVERSE_VISUALS:
-        print(f"Warning: Invalid universe '{universe}', using fallback")
+        logger.warning("Invalid universe '%s', using fallback", universe)
         return FALLBACK_AVATAR_PROMPT
 
     if not isinstance(fuels, list) or len(fuels) != 2:
-        print(f"Warning: Invalid fuels {fuels}, using fallback")
+        logger.warning("Invalid fuels %s, using fallback", fuels)
         return FALLBACK_AVATAR_PROMPT
 
     if element not in ELEMENT_VISUALS:
-        print(f"Warning: Invalid element '{element}', using fallback")
+        logger.warning("Invalid element '%s', using fallback", element)
         return FALLBACK_AVATAR_PROMPT
 
     # Build context for Claude
@@ -375,20 +806,7 @@ def generate_avatar_prompt(universe: str, fuels: list, element: str) -> str:
     fuel_descs = [FUEL_VISUALS.get(f, f) for f in fuels]
     element_desc = ELEMENT_VISUALS[element]
 
-    # Map universes to fitting character archetypes
-    universe_archetypes = {
-        'scifi': 'space captain, starship pilot, or galactic explorer',
-        'fantasy': 'legendary hero, mystical ranger, or arcane mage',
-        'cyberpunk': 'netrunner, street samurai, or rogue hacker',
-        'retro': 'arcade champion, pixel warrior, or retro game hero',
-        'nature': 'forest guardian, elemental druid, or nature spirit',
-        'steampunk': 'airship captain, clockwork inventor, or brass-clad adventurer',
-        'cosmic': 'cosmic voyager, astral being, or starborn guardian',
-        'postapoc': 'wasteland survivor, road warrior, or resistance fighter',
-        'noir': 'hardboiled detective, shadow operative, or mystery solver',
-        'underwater': 'deep sea explorer, ocean guardian, or aquatic adventurer',
-    }
-    archetype = universe_archetypes.get(universe, 'mythical hero')
+    archetype = UNIVERSE_ARCHETYPES.get(universe, 'mythical hero')
 
     system_prompt = """You are a creative prompt engineer. Generate an image generation prompt for transforming a selfie into a stylized character avatar.
 
@@ -410,6 +828,7 @@ Write a detailed prompt that:
 7. Creates something fun and shareable - a profile picture they'd be proud of"""
 
     try:
+        claude_rate_limit.acquire()
         response = client.messages.create(
             model="claude-sonnet-4-20250514",
             max_tokens=300,
@@ -423,23 +842,45 @@ Write a detailed prompt that:
 
         # Basic sanity check
         if len(prompt) < 50:
-            print(f"Warning: Generated prompt too short ({len(prompt)} chars)")
+            logger.warning("Generated prompt too short (%s chars)", len(prompt))
             return FALLBACK_AVATAR_PROMPT
 
         return prompt
 
     except anthropic.APITimeoutError:
-        print("Warning: Claude API timeout, using fallback prompt")
+        logger.warning("Claude API timeout, using fallback prompt")
         return FALLBACK_AVATAR_PROMPT
     except anthropic.APIError as e:
-        print(f"Warning: Claude API error: {e}, using fallback prompt")
+        logger.warning("Claude API error: %s, using fallback prompt", e)
         return FALLBACK_AVATAR_PROMPT
     except Exception as e:
-        print(f"Warning: Unexpected error generating prompt: {e}")
+        logger.warning("Unexpected error generating prompt: %s", e)
         return FALLBACK_AVATAR_PROMPT
 
 
-PREGENERATED_PLANS = {
+@lru_cache(maxsize=2048)
+def _personalized_avatar_prompt(universe, fuels, element):
+    """Memoized generate_avatar_prompt; raises instead of caching the fallback."""
+    prompt = generate_avatar_prompt(universe, list(fuels), element)
+    if prompt == FALLBACK_AVATAR_PROMPT:
+        # lru_cache does not store exceptions, so a transient API failure
+        # doesn't pin this preference combination to the fallback.
+        raise LookupError('no personalized prompt')
+    return prompt
+
+
+def get_avatar_prompt(universe, fuels, element):
+    """Return the personalized prompt for a preference combination, reusing earlier results.
+
+    Fuels are sorted so the same interests in a different order share an entry.
+    """
+    try:
+        return _personalized_avatar_prompt(universe, tuple(sorted(fuels)), element)
+    except LookupError:
+        return FALLBACK_AVATAR_PROMPT
+
+
+_PREGENERATED_PLAN_HTML = {
     'Email & Calendar (Outlook, Gmail)': """
 <h3>The Vision</h3>
 <p>Imagine being able to type <strong>"Schedule a meeting with the dev team next Tuesday at 2pm"</strong> or <strong>"Show me all emails from Sarah about the budget"</strong> into a simple chat interface — and have it just happen. That's what you're building: an AI-powered assistant that talks to your email and calendar so you don't have to click through menus.</p>
@@ -772,31 +1213,73 @@ PREGENERATED_PLANS = {
 </ul>""",
 }
 
+# Pre-generated plans are held zlib-compressed; only recently used ones are
+# kept decompressed (see get_pregenerated_plan).
+PREGENERATED_PLANS = {
+    option: zlib.compress(plan.encode('utf-8'), 9)
+    for option, plan in _PREGENERATED_PLAN_HTML.items()
+}
+del _PREGENERATED_PLAN_HTML
+
+
+# Product names that route a free-text "Other" answer to a pre-generated plan.
+# Only an answer that is exactly one of these names is routed; anything longer
+# ("ServiceNow email notifications") may mean something else and goes to Claude.
+PLAN_PRODUCTS = {
+    'outlook': 'Email & Calendar (Outlook, Gmail)',
+    'microsoft outlook': 'Email & Calendar (Outlook, Gmail)',
+    'gmail': 'Email & Calendar (Outlook, Gmail)',
+    'excel': 'Spreadsheets & Reports (Excel, Google Sheets)',
+    'microsoft excel': 'Spreadsheets & Reports (Excel, Google Sheets)',
+    'google sheets': 'Spreadsheets & Reports (Excel, Google Sheets)',
+    'jira': 'Project Management (Jira, Trello, Asana)',
+    'trello': 'Project Management (Jira, Trello, Asana)',
+    'asana': 'Project Management (Jira, Trello, Asana)',
+    'microsoft word': 'Document Creation (Word, Google Docs)',
+    'ms word': 'Document Creation (Word, Google Docs)',
+    'google docs': 'Document Creation (Word, Google Docs)',
+    'salesforce': 'CRM & Sales Tools (Salesforce, HubSpot)',
+    'hubspot': 'CRM & Sales Tools (Salesforce, HubSpot)',
+    'sharepoint': 'File Organization & Storage (SharePoint, Drive)',
+    'google drive': 'File Organization & Storage (SharePoint, Drive)',
+    'onedrive': 'File Organization & Storage (SharePoint, Drive)',
+    'netbox': 'Network Source of Truth (Netbox, Nautobot, Infrahub, IP Fabric, NetBrain, etc.)',
+    'nautobot': 'Network Source of Truth (Netbox, Nautobot, Infrahub, IP Fabric, NetBrain, etc.)',
+    'infrahub': 'Network Source of Truth (Netbox, Nautobot, Infrahub, IP Fabric, NetBrain, etc.)',
+    'ip fabric': 'Network Source of Truth (Netbox, Nautobot, Infrahub, IP Fabric, NetBrain, etc.)',
+    'netbrain': 'Network Source of Truth (Netbox, Nautobot, Infrahub, IP Fabric, NetBrain, etc.)',
+}
+
+# Plan sections whose heading names the user's product when a plan is reused
+PERSONALIZED_PLAN_HEADINGS = ('The Vision', 'Suggested Tech Stack',
+                              'Core Features Breakdown', 'Vibe Coding Approach')
 
-def generate_vibe_plan(wishlist_app: str) -> tuple:
-    """
-    Generate a vibe coding kickstart plan for the user's app idea.
 
-    Args:
-        wishlist_app: User's description of what they want to build
+def match_pregenerated_plan(wishlist_app):
+    """Return the predefined option a free-text answer names exactly, or None."""
+    return PLAN_PRODUCTS.get(' '.join(wishlist_app.split()).lower().strip('.!?'))
 
-    Returns:
-        Tuple of (plan_content, success)
-        - plan_content: HTML-formatted plan or error message
-        - success: True if generation succeeded
-    """
-    client = get_claude_client()
 
-    # Validate input
-    if not wishlist_app or not wishlist_app.strip():
-        return (VIBE_PLAN_ERROR_MESSAGE, False)
+def personalize_plan(plan_html, app_name):
+    """Put the user's product name into a reused plan's section headings."""
+    name = escape(' '.join(app_name.split()))
+    for heading in PERSONALIZED_PLAN_HEADINGS:
+        plan_html = plan_html.replace(f'<h3>{heading}</h3>', f'<h3>{heading}: {name}</h3>', 1)
+    return plan_html
 
-    if not client:
-        return (VIBE_PLAN_ERROR_MESSAGE, False)
 
-    wishlist_app = wishlist_app.strip()
+@lru_cache(maxsize=4)
+def get_pregenerated_plan(wishlist_app):
+    """Return the pre-generated plan HTML for a predefined wishlist option."""
+    return zlib.decompress(PREGENERATED_PLANS[wishlist_app]).decode('utf-8')
+
+
+# Static instructions for vibe plan generation. Kept separate from the per-user
+# input so Anthropic can cache the whole block across requests; the worked
+# example also keeps it above the 1024-token minimum for a cacheable prefix.
+VIBE_PLAN_EXAMPLE_OPTION = 'Email & Calendar (Outlook, Gmail)'
 
-    system_prompt = """You are a helpful AI assistant explaining how to "vibe code" - building software by describing what you want to an AI coding assistant like Claude or ChatGPT. The user does NOT need to know how to code. They just describe what they want in plain English and the AI writes the code for them.
+VIBE_PLAN_SYSTEM_PROMPT = """You are a helpful AI assistant explaining how to "vibe code" - building software by describing what you want to an AI coding assistant like Claude or ChatGPT. The user does NOT need to know how to code. They just describe what they want in plain English and the AI writes the code for them.
 
 IMPORTANT CONTEXT:
 - If the user mentions an existing product/platform (like ServiceNow, Salesforce, Jira, SAP, etc.), they want to build an AI-powered natural language interface TO that product - a way to chat with it, automate it, or query it using plain English. They are NOT trying to rebuild the product itself.
@@ -811,22 +1294,20 @@ Create a practical kickstart guide in HTML format. Use these exact HTML tags:
 - <strong> for emphasis
 - <pre> for code/prompt blocks
 
-Keep the guide under 1500 words. Be encouraging and emphasize that they don't need to know how to code."""
+Keep the guide under 1500 words. Be encouraging and emphasize that they don't need to know how to code.
 
-    user_prompt = f"""The user wants to interact with, automate, or build something related to: "{wishlist_app}"
-
-If this is an existing product/platform, assume they want to build an AI-powered chatbot or natural language interface that connects to it - so they can ask questions or give commands in plain English instead of clicking through menus.
+If the user's request is an existing product/platform, assume they want to build an AI-powered chatbot or natural language interface that connects to it - so they can ask questions or give commands in plain English instead of clicking through menus.
 
 Create a vibe coding kickstart guide with these sections:
 
 <h3>The Vision</h3>
-Describe what they're building (likely an AI chat interface to {wishlist_app}). Emphasize this is totally achievable without coding experience - they'll describe what they want and let Claude/ChatGPT write all the code.
+Describe what they're building (likely an AI chat interface to the product they named). Emphasize this is totally achievable without coding experience - they'll describe what they want and let Claude/ChatGPT write all the code.
 
 <h3>Suggested Tech Stack</h3>
 Recommend the SIMPLEST possible approach. Consider:
 - Python (Claude can write it all for you)
 - Streamlit or Gradio for a simple chat UI (no web development needed)
-- If {wishlist_app} has an API, mention it. If not, suggest alternatives.
+- If the product they named has an API, mention it. If not, suggest alternatives.
 Explain each choice in plain English - no jargon.
 
 <h3>Core Features Breakdown</h3>
@@ -848,38 +1329,152 @@ Include this exact HTML:
 3-4 practical tips for someone who has never coded before. Include things like:
 - Don't be afraid to say "that didn't work, here's the error message"
 - Start small and add features one at a time
-- It's okay to ask the AI to explain what the code does"""
+- It's okay to ask the AI to explain what the code does
+
+Below is an example guide written for another request. Match its tone, structure and depth, but write a new guide specific to this user's request."""
+VIBE_PLAN_SYSTEM_PROMPT += (
+    f'\n\n<example request="{VIBE_PLAN_EXAMPLE_OPTION}">\n'
+    f'{zlib.decompress(PREGENERATED_PLANS[VIBE_PLAN_EXAMPLE_OPTION]).decode("utf-8").strip()}\n'
+    '</example>'
+)
+
+
+def generate_vibe_plan(wishlist_app: str) -> tuple:
+    """
+    Generate a vibe coding kickstart plan for the user's app idea.
+
+    Args:
+        wishlist_app: User's description of what they want to build
+
+    Returns:
+        Tuple of (plan_content, success)
+        - plan_content: HTML-formatted plan or error message
+        - success: True if generation succeeded
+    """
+    client = get_claude_client()
+
+    # Validate input
+    if not wishlist_app or not wishlist_app.strip():
+        return (VIBE_PLAN_ERROR_MESSAGE, False)
+
+    if not client:
+        return (VIBE_PLAN_ERROR_MESSAGE, False)
+
+    wishlist_app = wishlist_app.strip()
+
+    user_prompt = f'The user wants to interact with, automate, or build something related to: "{wishlist_app}"'
 
     try:
+        claude_rate_limit.acquire()
         response = client.messages.create(
             model="claude-sonnet-4-20250514",
             max_tokens=2000,
             messages=[
                 {"role": "user", "content": user_prompt}
             ],
-            system=system_prompt,
+            system=[
+                {
+                    "type": "text",
+                    "text": VIBE_PLAN_SYSTEM_PROMPT,
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ],
         )
 
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            logger.debug("[PLAN] Claude usage: input=%s, cache_read=%s, cache_write=%s",
+                         usage.input_tokens, usage.cache_read_input_tokens,
+                         usage.cache_creation_input_tokens)
+
         plan = response.content[0].text.strip()
 
         # Basic sanity check
         if len(plan) < 200 or '<h3>' not in plan:
-            print(f"Warning: Generated plan seems invalid (length: {len(plan)})")
+            logger.warning("Generated plan seems invalid (length: %s)", len(plan))
             return (VIBE_PLAN_ERROR_MESSAGE, False)
 
         return (plan, True)
 
     except anthropic.APITimeoutError:
-        print("Warning: Claude API timeout generating vibe plan")
+        logger.warning("Claude API timeout generating vibe plan")
         return (VIBE_PLAN_ERROR_MESSAGE, False)
     except anthropic.APIError as e:
-        print(f"Warning: Claude API error generating vibe plan: {e}")
+        logger.warning("Claude API error generating vibe plan: %s", e)
         return (VIBE_PLAN_ERROR_MESSAGE, False)
     except Exception as e:
-        print(f"Warning: Unexpected error generating vibe plan: {e}")
+        logger.warning("Unexpected error generating vibe plan: %s", e)
         return (VIBE_PLAN_ERROR_MESSAGE, False)
 
 
+# Gemini circuit breaker: after repeated overload errors (across all requests)
+# stop calling the API for a cool-down period and fail avatars fast instead.
+GEMINI_BREAKER_THRESHOLD = 3
+GEMINI_BREAKER_COOLDOWN = 30  # seconds
+_gemini_breaker = {'failures': 0, 'open_until': 0.0}
+_gemini_breaker_lock = threading.Lock()
+
+
+def gemini_breaker_open():
+    """Return True while the Gemini circuit breaker is in its cool-down period."""
+    with _gemini_breaker_lock:
+        return time.time() < _gemini_breaker['open_until']
+
+
+def record_gemini_result(overloaded):
+    """Track consecutive Gemini overload errors and trip the breaker if needed."""
+    with _gemini_breaker_lock:
+        if not overloaded:
+            _gemini_breaker['failures'] = 0
+            return
+        _gemini_breaker['failures'] += 1
+        if _gemini_breaker['failures'] >= GEMINI_BREAKER_THRESHOLD:
+            _gemini_breaker['open_until'] = time.time() + GEMINI_BREAKER_COOLDOWN
+            _gemini_breaker['failures'] = 0
+            logger.warning("[AVATAR] Gemini circuit breaker open for %ss", GEMINI_BREAKER_COOLDOWN)
+
+
+def decode_image_data(data):
+    """Decode a base64 image given either as a data URL or as bare base64.
+
+    Slices past the data URL header with a memoryview instead of str.split,
+    so a multi-megabyte selfie isn't copied an extra time.
+    """
+    raw = data.encode('ascii') if isinstance(data, str) else data
+    comma = raw.find(b',')
+    return base64.b64decode(memoryview(raw)[comma + 1:])
+
+
+def plan_cache_key(wishlist_app: str) -> str:
+    """Hash a wishlist input so trivially different spellings share a cache entry."""
+    normalized = ' '.join(wishlist_app.split()).lower()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def get_cached_plan(wishlist_app):
+    """Return a previously generated plan for the same wishlist input, if any."""
+    with db_conn() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT plan_content FROM plan_cache WHERE prompt_hash = %s',
+                    (plan_cache_key(wishlist_app),))
+        row = cur.fetchone()
+        cur.close()
+    return row['plan_content'] if row else None
+
+
+def cache_plan(cur, wishlist_app, plan_content):
+    """Store a generated plan so repeat inputs skip the Claude call.
+
+    Runs on the caller's cursor so it commits together with the plan's
+    status update.
+    """
+    cur.execute('''
+        INSERT INTO plan_cache (prompt_hash, wishlist_input, plan_content)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (prompt_hash) DO NOTHING
+    ''', (plan_cache_key(wishlist_app), wishlist_app, plan_content))
+
+
 def generate_avatar_async(avatar_id, email, selfie_base64, response_id, preferences=None):
     """Background task to generate avatar using Gemini.
 
@@ -890,7 +1485,7 @@ def generate_avatar_async(avatar_id, email, selfie_base64, response_id, preferen
         response_id: ID of the response record (for coordination)
         preferences: Optional dict with avatar_universe, avatar_fuels, avatar_element
     """
-    print(f"[AVATAR] Starting generation for avatar_id={avatar_id}, email={email}")
+    logger.debug("[AVATAR] Starting generation for avatar_id=%s, email=%s", avatar_id, email)
 
     # Retry configuration
     MAX_RETRIES = 3
@@ -898,33 +1493,27 @@ def generate_avatar_async(avatar_id, email, selfie_base64, response_id, preferen
     RETRYABLE_ERRORS = ['503', 'UNAVAILABLE', 'overloaded', '429', 'RESOURCE_EXHAUSTED']
 
     try:
-        if not GEMINI_API_KEY:
+        client = get_gemini_client()
+        if not client:
             raise Exception("Gemini API key not configured")
 
-        print(f"[AVATAR] API key present (length: {len(GEMINI_API_KEY)})")
-
-        # Initialize Gemini client
-        print("[AVATAR] Initializing Gemini client...")
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        print("[AVATAR] Gemini client initialized")
-
         # Decode the selfie image
-        print(f"[AVATAR] Decoding selfie image (base64 length: {len(selfie_base64)})")
-        image_data = base64.b64decode(selfie_base64.split(',')[1] if ',' in selfie_base64 else selfie_base64)
-        print(f"[AVATAR] Image decoded successfully (size: {len(image_data)} bytes)")
+        logger.debug("[AVATAR] Decoding selfie image (base64 length: %s)", len(selfie_base64))
+        image_data = decode_image_data(selfie_base64)
+        logger.debug("[AVATAR] Image decoded successfully (size: %s bytes)", len(image_data))
 
         # Generate personalized prompt or use fallback
         if preferences and all(k in preferences for k in ['avatar_universe', 'avatar_fuels', 'avatar_element']):
-            print(f"[AVATAR] Generating personalized prompt from preferences: {preferences}")
-            prompt = generate_avatar_prompt(
+            logger.debug("[AVATAR] Generating personalized prompt from preferences: %s", preferences)
+            prompt = get_avatar_prompt(
                 universe=preferences['avatar_universe'],
                 fuels=preferences['avatar_fuels'],
                 element=preferences['avatar_element']
             )
             is_personalized = prompt != FALLBACK_AVATAR_PROMPT
-            print(f"[AVATAR] Using {'personalized' if is_personalized else 'fallback'} prompt")
+            logger.debug("[AVATAR] Using %s prompt", 'personalized' if is_personalized else 'fallback')
         else:
-            print(f"[AVATAR] No preferences or incomplete preferences, using static prompt")
+            logger.debug("[AVATAR] No preferences or incomplete preferences, using static prompt")
             prompt = FALLBACK_AVATAR_PROMPT
 
         # Upload the image and generate with retry logic
@@ -933,9 +1522,13 @@ def generate_avatar_async(avatar_id, email, selfie_base64, response_id, preferen
         last_error = None
 
         for attempt in range(MAX_RETRIES):
+            if gemini_breaker_open():
+                raise last_error or Exception("Gemini temporarily unavailable (circuit breaker open)")
+
             try:
-                print(f"[AVATAR] Calling Gemini API with model: {model_name} (attempt {attempt + 1}/{MAX_RETRIES})")
+                logger.debug("[AVATAR] Calling Gemini API with model: %s (attempt %s/%s)", model_name, attempt + 1, MAX_RETRIES)
 
+                gemini_rate_limit.acquire()
                 response = client.models.generate_content(
                     model=model_name,
                     contents=[
@@ -951,7 +1544,8 @@ def generate_avatar_async(avatar_id, email, selfie_base64, response_id, preferen
                     )
                 )
                 # Success - break out of retry loop
-                print(f"[AVATAR] Gemini API response received on attempt {attempt + 1}")
+                logger.debug("[AVATAR] Gemini API response received on attempt %s", attempt + 1)
+                record_gemini_result(overloaded=False)
                 break
 
             except Exception as api_error:
@@ -960,77 +1554,76 @@ def generate_avatar_async(avatar_id, email, selfie_base64, response_id, preferen
 
                 # Check if this is a retryable error
                 is_retryable = any(err in error_str for err in RETRYABLE_ERRORS)
+                if is_retryable:
+                    record_gemini_result(overloaded=True)
 
                 if is_retryable and attempt < MAX_RETRIES - 1:
-                    delay = BASE_DELAY * (2 ** attempt)  # Exponential backoff: 2s, 4s, 8s
-                    print(f"[AVATAR] Retryable error on attempt {attempt + 1}: {error_str}")
-                    print(f"[AVATAR] Waiting {delay}s before retry...")
+                    # Exponential backoff (2s, 4s) plus jitter so retries don't arrive in lockstep
+                    delay = BASE_DELAY * (2 ** attempt)
+                    delay += random.uniform(0, delay / 2)
+                    logger.debug("[AVATAR] Retryable error on attempt %s: %s", attempt + 1, error_str)
+                    logger.debug("[AVATAR] Waiting %.1fs before retry...", delay)
                     time.sleep(delay)
                 else:
                     # Not retryable or last attempt - re-raise
-                    print(f"[AVATAR] Non-retryable error or max retries reached: {error_str}")
+                    logger.debug("[AVATAR] Non-retryable error or max retries reached: %s", error_str)
                     raise api_error
 
         if response is None:
             raise last_error or Exception("No response from Gemini API after retries")
 
-        print(f"[AVATAR] Response candidates: {len(response.candidates) if response.candidates else 0}")
+        logger.debug("[AVATAR] Response candidates: %s", len(response.candidates) if response.candidates else 0)
 
         # Extract the generated image
         generated_image = None
         if response.candidates:
-            print(f"[AVATAR] Candidate 0 parts: {len(response.candidates[0].content.parts) if response.candidates[0].content.parts else 0}")
+            logger.debug("[AVATAR] Candidate 0 parts: %s", len(response.candidates[0].content.parts) if response.candidates[0].content.parts else 0)
             for i, part in enumerate(response.candidates[0].content.parts):
-                print(f"[AVATAR] Part {i}: has_inline_data={part.inline_data is not None}, has_text={part.text is not None if hasattr(part, 'text') else 'N/A'}")
+                logger.debug("[AVATAR] Part %s: has_inline_data=%s, has_text=%s", i, part.inline_data is not None, part.text is not None if hasattr(part, 'text') else 'N/A')
                 if part.inline_data:
-                    print(f"[AVATAR] Found inline_data, mime_type={part.inline_data.mime_type}, size={len(part.inline_data.data)} bytes")
-                    generated_image = base64.b64encode(part.inline_data.data).decode('utf-8')
+                    logger.debug("[AVATAR] Found inline_data, mime_type=%s, size=%s bytes", part.inline_data.mime_type, len(part.inline_data.data))
+                    generated_image = part.inline_data.data
                     break
                 elif hasattr(part, 'text') and part.text:
-                    print(f"[AVATAR] Text response: {part.text[:200]}...")
+                    logger.debug("[AVATAR] Text response: %s...", part.text[:200])
 
         if not generated_image:
             raise Exception("No image generated in response - check logs for details")
 
-        print(f"[AVATAR] Image generated successfully (base64 length: {len(generated_image)})")
+        logger.debug("[AVATAR] Image generated successfully (size: %s bytes)", len(generated_image))
 
         # Update database with success
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute('''
-            UPDATE avatars
-            SET image_data = %s, status = 'completed', completed_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        ''', (generated_image, avatar_id))
-        conn.commit()
-        cur.close()
-        conn.close()
-        print(f"[AVATAR] Database updated with completed status")
+        with db_conn() as conn:
+            cur = conn.cursor()
+            cur.execute('''
+                UPDATE avatars
+                SET image_data = %s, status = 'completed', completed_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            ''', (psycopg2.Binary(generated_image), avatar_id))
+            conn.commit()
+            cur.close()
+        logger.debug("[AVATAR] Database updated with completed status")
 
         # Check if we should send email (coordination with plan)
-        print(f"[AVATAR] Checking email coordination for response_id={response_id}")
-        check_and_send_email(response_id, email)
-        print(f"[AVATAR] Generation complete for avatar_id={avatar_id}")
+        task_finished(response_id, email, 'avatar', avatar_id)
+        logger.debug("[AVATAR] Generation complete for avatar_id=%s", avatar_id)
 
     except Exception as e:
-        import traceback
-        print(f"[AVATAR ERROR] Avatar generation failed: {e}")
-        print(f"[AVATAR ERROR] Traceback: {traceback.format_exc()}")
+        logger.exception("[AVATAR] Avatar generation failed for avatar_id=%s", avatar_id)
         # Update database with error
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute('''
-            UPDATE avatars
-            SET status = 'failed', error_message = %s, completed_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        ''', (str(e), avatar_id))
-        conn.commit()
-        cur.close()
-        conn.close()
-        print(f"[AVATAR ERROR] Database updated with failed status")
+        with db_conn() as conn:
+            cur = conn.cursor()
+            cur.execute('''
+                UPDATE avatars
+                SET status = 'failed', error_message = %s, completed_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            ''', (str(e), avatar_id))
+            conn.commit()
+            cur.close()
+        logger.debug("[AVATAR] Database updated with failed status")
 
         # Still check email in case plan is ready
-        check_and_send_email(response_id, email)
+        task_finished(response_id, email, 'avatar', None)
 
 
 def generate_plan_async(plan_id, email, wishlist_app, response_id):
@@ -1042,196 +1635,296 @@ def generate_plan_async(plan_id, email, wishlist_app, response_id):
         wishlist_app: User's wishlist app description
         response_id: ID of the response record (for coordination)
     """
-    print(f"[PLAN] Starting generation for plan_id={plan_id}, email={email}")
+    logger.debug("[PLAN] Starting generation for plan_id=%s, email=%s", plan_id, email)
 
     try:
         # Check for pre-generated plan first (for predefined radio options)
+        newly_generated = False
+        matched_option = match_pregenerated_plan(wishlist_app)
         if wishlist_app in PREGENERATED_PLANS:
-            print(f"[PLAN] Using pre-generated plan for: {wishlist_app}")
-            plan_content = PREGENERATED_PLANS[wishlist_app]
+            logger.debug("[PLAN] Using pre-generated plan for: %s", wishlist_app)
+            plan_content = get_pregenerated_plan(wishlist_app)
+            success = True
+        elif matched_option:
+            logger.debug("[PLAN] Custom input '%s' matched pre-generated plan: %s", wishlist_app, matched_option)
+            plan_content = personalize_plan(get_pregenerated_plan(matched_option), wishlist_app)
             success = True
         else:
-            print(f"[PLAN] Custom 'Other' input, calling Claude API: {wishlist_app}")
-            plan_content, success = generate_vibe_plan(wishlist_app)
-
-        conn = get_db()
-        cur = conn.cursor()
+            plan_content = get_cached_plan(wishlist_app)
+            if plan_content:
+                logger.debug("[PLAN] Using cached plan for: %s", wishlist_app)
+                success = True
+            else:
+                logger.debug("[PLAN] Custom 'Other' input, calling Claude API: %s", wishlist_app)
+                plan_content, success = generate_vibe_plan(wishlist_app)
+                newly_generated = success
 
         if success:
+            logger.debug("[PLAN] Plan generated successfully")
+        else:
+            # plan_content contains the error message on failure
+            logger.warning("[PLAN] Plan generation failed for plan_id=%s: %s", plan_id, plan_content)
+
+        with db_conn() as conn:
+            cur = conn.cursor()
             cur.execute('''
                 UPDATE vibe_plans
-                SET plan_content = %s, status = 'completed', completed_at = CURRENT_TIMESTAMP
+                SET status = %s, plan_content = %s, error_message = %s, completed_at = CURRENT_TIMESTAMP
                 WHERE id = %s
-            ''', (plan_content, plan_id))
-            print(f"[PLAN] Plan generated successfully")
-        else:
+            ''', ('completed' if success else 'failed',
+                  plan_content if success else None,
+                  None if success else plan_content,
+                  plan_id))
+            if newly_generated:
+                cache_plan(cur, wishlist_app, plan_content)
+            conn.commit()
+            cur.close()
+
+        # Check if we should send email
+        task_finished(response_id, email, 'plan', plan_content if success else None)
+
+    except Exception as e:
+        logger.exception("[PLAN] Plan generation failed for plan_id=%s", plan_id)
+
+        with db_conn() as conn:
+            cur = conn.cursor()
             cur.execute('''
                 UPDATE vibe_plans
                 SET status = 'failed', error_message = %s, completed_at = CURRENT_TIMESTAMP
                 WHERE id = %s
-            ''', (plan_content, plan_id))  # plan_content contains error message on failure
-            print(f"[PLAN] Plan generation failed: {plan_content}")
+            ''', (str(e), plan_id))
+            conn.commit()
+            cur.close()
 
-        conn.commit()
-        cur.close()
-        conn.close()
+        # Still check email
+        task_finished(response_id, email, 'plan', None)
 
-        # Check if we should send email
+
+# In-process completion barrier: submit() registers which jobs a response is
+# waiting on, and the last one to finish sends the email from the results it
+# already holds. Jobs with no registration here (e.g. queued before a restart)
+# fall back to check_and_send_email(), which coordinates through the database.
+_PENDING = object()
+_pending_sends = {}
+_pending_lock = threading.Lock()
+
+
+def expect_results(response_id, avatar=False, plan=False):
+    """Register the background jobs whose results the response's email waits for."""
+    with _pending_lock:
+        _pending_sends[response_id] = {
+            'avatar': _PENDING if avatar else None,
+            'plan': _PENDING if plan else None,
+        }
+
+
+def task_finished(response_id, email, kind, result):
+    """Record a finished job and send the combined email once all are in.
+
+    Args:
+        kind: 'avatar' or 'plan'
+        result: the avatar id or plan HTML on success, None on failure
+    """
+    with _pending_lock:
+        slot = _pending_sends.get(response_id)
+        if slot is not None:
+            slot[kind] = result
+            if _PENDING in slot.values():
+                logger.debug("[EMAIL] %s done, still waiting for response_id=%s", kind, response_id)
+                return
+            del _pending_sends[response_id]
+
+    if slot is None:
         check_and_send_email(response_id, email)
+        return
 
-    except Exception as e:
-        import traceback
-        print(f"[PLAN ERROR] Plan generation failed: {e}")
-        print(f"[PLAN ERROR] Traceback: {traceback.format_exc()}")
+    avatar_id, plan_content = slot['avatar'], slot['plan']
+    if not (avatar_id or plan_content):
+        logger.debug("[EMAIL] No successful content to send for %s", email)
+        return
 
-        conn = get_db()
+    with db_conn() as conn:
         cur = conn.cursor()
-        cur.execute('''
-            UPDATE vibe_plans
-            SET status = 'failed', error_message = %s, completed_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        ''', (str(e), plan_id))
+        claimed = claim_email(cur, response_id)
         conn.commit()
         cur.close()
-        conn.close()
 
-        # Still check email
-        check_and_send_email(response_id, email)
+    if claimed and not send_combined_email(email, avatar_id, plan_content):
+        release_email_claim(response_id)
+
+
+# Response ids whose email is known to be sent, so repeat checks skip the DB.
+# The ids come from a sequence that is never reset, so an id can't be reused
+# for a newer response while it is remembered here.
+SENT_EMAIL_TTL = 86400
+_sent_emails = {}
+_sent_emails_lock = threading.Lock()
+
+
+def email_already_sent(response_id):
+    """True if the response's email is known (in this process) to be sent."""
+    with _sent_emails_lock:
+        expires = _sent_emails.get(response_id)
+    return expires is not None and expires > time.monotonic()
+
+
+def remember_email_sent(response_id):
+    """Record that the response's email has been sent (or claimed)."""
+    with _sent_emails_lock:
+        if len(_sent_emails) >= 10000:
+            _sent_emails.clear()
+        _sent_emails[response_id] = time.monotonic() + SENT_EMAIL_TTL
+
+
+def claim_email(cur, response_id):
+    """Mark the response's email as sent; False if it already was."""
+    cur.execute('''
+        UPDATE responses SET email_sent_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND email_sent_at IS NULL
+        RETURNING id
+    ''', (response_id,))
+    claimed = cur.fetchone() is not None
+    # Either way email_sent_at is now set for this response
+    remember_email_sent(response_id)
+    return claimed
+
+
+def release_email_claim(response_id):
+    """Undo claim_email() for an email that did not go out."""
+    with db_conn() as conn:
+        cur = conn.cursor()
+        cur.execute('UPDATE responses SET email_sent_at = NULL WHERE id = %s', (response_id,))
+        conn.commit()
+        cur.close()
+    with _sent_emails_lock:
+        _sent_emails.pop(response_id, None)
 
 
 def check_and_send_email(response_id, email):
     """Check if all async tasks are complete and send combined email if ready.
 
     Called after each task (avatar or plan) completes. Only sends email once
-    when all expected tasks are done.
+    when all expected tasks are done; responses.email_sent_at is claimed
+    atomically so two tasks finishing together cannot both send.
     """
-    print(f"[EMAIL] Checking coordination for response_id={response_id}")
+    if email_already_sent(response_id):
+        logger.debug("[EMAIL] Email already sent for response_id=%s", response_id)
+        return
 
-    conn = get_db()
-    cur = conn.cursor()
+    logger.debug("[EMAIL] Checking coordination for response_id=%s", response_id)
 
-    # Check avatar status (if one exists for this response)
-    cur.execute('''
-        SELECT id, status, image_data FROM avatars WHERE response_id = %s
-    ''', (response_id,))
-    avatar = cur.fetchone()
+    with db_conn() as conn:
+        cur = conn.cursor()
 
-    # Check plan status (if one exists for this response)
-    cur.execute('''
-        SELECT id, status, plan_content FROM vibe_plans WHERE response_id = %s
-    ''', (response_id,))
-    plan = cur.fetchone()
+        # Fetch avatar and plan status (either may be missing) in one round-trip
+        cur.execute('''
+            SELECT a.id AS avatar_id, a.status AS avatar_status,
+                   p.status AS plan_status, p.plan_content
+            FROM responses r
+            LEFT JOIN avatars a ON a.response_id = r.id
+            LEFT JOIN vibe_plans p ON p.response_id = r.id
+            WHERE r.id = %s AND r.email_sent_at IS NULL
+        ''', (response_id,))
+        row = cur.fetchone()
+
+        if row is None:
+            # Already sent (or the response is gone): nothing left to coordinate
+            cur.close()
+            remember_email_sent(response_id)
+            logger.debug("[EMAIL] Email already sent for response_id=%s", response_id)
+            return
+
+        # Determine what we're waiting for
+        avatar_pending = row['avatar_status'] == 'pending'
+        plan_pending = row['plan_status'] == 'pending'
 
-    cur.close()
-    conn.close()
+        if avatar_pending or plan_pending:
+            cur.close()
+            logger.debug("[EMAIL] Still waiting - avatar_pending=%s, plan_pending=%s", avatar_pending, plan_pending)
+            return
+
+        # All tasks complete (or failed), send email
+        avatar_id = None
+        if row['avatar_status'] == 'completed':
+            avatar_id = row['avatar_id']
+
+        plan_content = None
+        if row['plan_status'] == 'completed':
+            plan_content = row['plan_content']
 
-    # Determine what we're waiting for
-    avatar_pending = avatar and avatar['status'] == 'pending'
-    plan_pending = plan and plan['status'] == 'pending'
+        # Only send if we have something to share
+        if not (avatar_id or plan_content):
+            cur.close()
+            logger.debug("[EMAIL] No successful content to send for %s", email)
+            return
+
+        # Both tasks can finish together and each see nothing pending; only the
+        # one that wins this claim sends the email.
+        claimed = claim_email(cur, response_id)
+        conn.commit()
+        cur.close()
 
-    if avatar_pending or plan_pending:
-        print(f"[EMAIL] Still waiting - avatar_pending={avatar_pending}, plan_pending={plan_pending}")
+    if not claimed:
+        logger.debug("[EMAIL] Email already sent for response_id=%s", response_id)
         return
 
-    # All tasks complete (or failed), send email
-    avatar_data = None
-    avatar_id = None
-    if avatar and avatar['status'] == 'completed':
-        avatar_id = avatar['id']
-        avatar_data = avatar['image_data']
-
-    plan_content = None
-    if plan and plan['status'] == 'completed':
-        plan_content = plan['plan_content']
-
-    # Only send if we have something to share
-    if avatar_id or plan_content:
-        print(f"[EMAIL] All tasks complete, sending combined email (avatar={avatar_id is not None}, plan={plan_content is not None})")
-        send_combined_email(email, avatar_id, avatar_data, plan_content)
-    else:
-        print(f"[EMAIL] No successful content to send for {email}")
+    logger.debug("[EMAIL] All tasks complete, sending combined email (avatar=%s, plan=%s)", avatar_id is not None, plan_content is not None)
+    if not send_combined_email(email, avatar_id, plan_content):
+        release_email_claim(response_id)
+
+
+# Compiled once at import; plan_content is trusted HTML and rendered unescaped.
+COMBINED_EMAIL_TEMPLATE = app.jinja_env.get_template('emails/combined.html')
+AVATAR_EMAIL_TEMPLATE = app.jinja_env.get_template('emails/avatar_ready.html')
+
+EMAIL_FROM = "Vibe Coding Survey <survey@seanmahoney.ai>"
+# Combined email subject by (has avatar, has plan)
+EMAIL_SUBJECTS = {
+    (True, True): "Your Wizard Avatar & Vibe Coding Plan are Ready!",
+    (True, False): "Your Vibe Coding Wizard Avatar is Ready!",
+    (False, True): "Your Vibe Coding Kickstart Plan is Ready!",
+}
 
 
-def send_combined_email(email, avatar_id=None, avatar_data=None, plan_content=None):
+def send_combined_email(email, avatar_id=None, plan_content=None):
     """Send email with embedded avatar image and/or vibe coding plan.
 
+    The avatar is attached by URL, so Resend fetches the image from the
+    avatar image route rather than us loading and re-encoding its bytes.
+
     Args:
         email: Recipient email address
         avatar_id: UUID of completed avatar (optional)
-        avatar_data: Base64-encoded avatar image data (optional)
         plan_content: HTML content of vibe plan (optional)
+
+    Returns:
+        True if the email was handed to Resend, False otherwise.
     """
     try:
         if not RESEND_API_KEY:
-            print("Resend API key not configured, skipping email")
-            return
+            logger.warning("Resend API key not configured, skipping email")
+            return False
 
-        # Build email subject
-        if avatar_id and plan_content:
-            subject = "Your Wizard Avatar & Vibe Coding Plan are Ready!"
-        elif avatar_id:
-            subject = "Your Vibe Coding Wizard Avatar is Ready!"
-        else:
-            subject = "Your Vibe Coding Kickstart Plan is Ready!"
+        subject = EMAIL_SUBJECTS[bool(avatar_id), bool(plan_content)]
 
-        # Build avatar section with embedded image
-        avatar_section = ""
+        # Embed image directly in email using CID
         attachments = []
-        if avatar_id and avatar_data:
-            # Embed image directly in email using CID
-            avatar_section = f"""
-                <div style="margin: 30px 0; text-align: center;">
-                    <h2 style="color: #667eea;">Your Wizard Avatar</h2>
-                    <p>Your personalized <strong>Vibe Coding Network Wizard</strong> avatar has been generated!</p>
-                    <img src="cid:avatar_image" alt="Your Wizard Avatar"
-                         style="max-width: 400px; width: 100%; border-radius: 12px; margin: 15px 0; box-shadow: 0 4px 15px rgba(0,0,0,0.2);">
-                    <p style="font-size: 14px; color: #666; margin-top: 10px;">
-                        Right-click on the image to save it, or view full-size at:<br>
-                        <a href="{APP_URL}/avatar/{avatar_id}" style="color: #667eea;">{APP_URL}/avatar/{avatar_id}</a>
-                    </p>
-                </div>
-            """
-            # Add image as CID attachment
+        if avatar_id:
             attachments.append({
-                "content": avatar_data,
+                "path": f"{APP_URL}/avatar/{avatar_id}/image.png",
                 "filename": "wizard-avatar.png",
                 "content_id": "avatar_image"
             })
 
-        # Build plan section
-        plan_section = ""
-        if plan_content:
-            plan_section = f"""
-                <div style="margin: 30px 0; padding: 20px; background: #f8f9fa; border-radius: 8px;">
-                    <h2 style="color: #667eea; margin-top: 0;">Your Vibe Coding Kickstart Plan</h2>
-                    <div style="line-height: 1.6;">
-                        {plan_content}
-                    </div>
-                </div>
-            """
-
-        # Compose full email
-        html_content = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 700px; margin: 0 auto; padding: 20px;">
-            <h1 style="color: #667eea; text-align: center;">Thanks for completing the survey!</h1>
-            <p style="font-size: 16px; color: #333; text-align: center;">
-                Thank you for completing the Pre-Presentation Knowledge Assessment!
-            </p>
-
-            {avatar_section}
-
-            {plan_section}
-
-            <div style="margin-top: 40px; padding-top: 20px; border-top: 1px solid #eee; text-align: center;">
-                <p style="font-size: 14px; color: #666;">
-                    See you at the presentation!
-                </p>
-            </div>
-        </div>
-        """
+        html_content = COMBINED_EMAIL_TEMPLATE.render(
+            app_url=APP_URL,
+            avatar_id=avatar_id,
+            embed_avatar=bool(attachments),
+            plan_content=plan_content,
+        )
 
         email_params = {
-            "from": "Vibe Coding Survey <survey@seanmahoney.ai>",
+            "from": EMAIL_FROM,
             "to": email,
             "subject": subject,
             "html": html_content
@@ -1241,56 +1934,66 @@ def send_combined_email(email, avatar_id=None, avatar_data=None, plan_content=No
         if attachments:
             email_params["attachments"] = attachments
 
-        resend.Emails.send(email_params)
-        print(f"[EMAIL] Combined email sent to {email} (embedded_avatar={len(attachments) > 0})")
+        if attachments or EMAIL_BATCH_WINDOW <= 0:
+            resend.Emails.send(email_params)
+        else:
+            _email_batcher.submit(email_params).result()
+        logger.info("[EMAIL] Combined email sent to %s (embedded_avatar=%s)", email, len(attachments) > 0)
+        return True
 
-    except Exception as e:
-        print(f"[EMAIL ERROR] Email send error: {e}")
+    except Exception:
+        logger.exception("[EMAIL] Email send error for %s", email)
+        return False
 
 
 def send_avatar_email(email, avatar_id):
     """Send email notification when avatar is ready."""
     try:
         if not RESEND_API_KEY:
-            print("Resend API key not configured, skipping email")
+            logger.warning("Resend API key not configured, skipping email")
             return
 
         avatar_url = f"{APP_URL}/avatar/{avatar_id}"
 
         resend.Emails.send({
-            "from": "Vibe Coding Survey <survey@seanmahoney.ai>",
+            "from": EMAIL_FROM,
             "to": email,
             "subject": "Your Vibe Coding Wizard Avatar is Ready!",
-            "html": f"""
-            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h1 style="color: #667eea; text-align: center;">Your Avatar is Ready!</h1>
-                <p style="font-size: 16px; color: #333;">
-                    Thank you for completing the Pre-Presentation Knowledge Assessment!
-                </p>
-                <p style="font-size: 16px; color: #333;">
-                    Your personalized <strong>Vibe Coding Network Wizard</strong> avatar has been generated.
-                </p>
-                <div style="text-align: center; margin: 30px 0;">
-                    <a href="{avatar_url}"
-                       style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                              color: white;
-                              padding: 15px 30px;
-                              text-decoration: none;
-                              border-radius: 8px;
-                              font-weight: bold;
-                              display: inline-block;">
-                        View Your Avatar
-                    </a>
-                </div>
-                <p style="font-size: 14px; color: #666; text-align: center;">
-                    Feel free to download and share it!
-                </p>
-            </div>
-            """
+            "html": AVATAR_EMAIL_TEMPLATE.render(avatar_url=avatar_url),
         })
-        print(f"Email sent to {email}")
-    except Exception as e:
-        print(f"Email send error: {e}")
+        logger.info("Email sent to %s", email)
+    except Exception:
+        logger.exception("Email send error for %s", email)
+
+
+# Responses worth compressing: the admin page embeds every response, and the
+# JSON endpoints are hit often. Images are already compressed.
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_MIMETYPES = {'text/html', 'application/json'}
+
+
+@app.after_request
+def compress_response(response):
+    """Gzip HTML/JSON bodies for clients that accept it."""
+    if (response.status_code != 200
+            or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.accept_encodings):
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    # The body no longer matches a strong validator for the uncompressed bytes
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
 
 
 @app.route('/')
@@ -1305,7 +2008,7 @@ def check_email():
     if not email:
         return jsonify({'allowed': False, 'message': 'Email required'})
 
-    count = get_avatar_count(email)
+    count = get_cached_avatar_count(email)
     allowed = count < MAX_AVATARS_PER_EMAIL
     remaining = MAX_AVATARS_PER_EMAIL - count
 
@@ -1316,202 +2019,284 @@ def check_email():
     })
 
 
-@app.route('/submit', methods=['POST'])
-def submit():
+AVATAR_FUELS_COUNT = SURVEY_QUESTIONS_BY_ID['avatar_fuels']['select_count']
+
+
+def extract_avatar_preferences(responses):
+    """Return the avatar preferences from survey responses, or None if incomplete."""
+    universe = responses.get('avatar_universe')
+    fuels = responses.get('avatar_fuels')
+    element = responses.get('avatar_element')
+    if universe and element and fuels and len(fuels) == AVATAR_FUELS_COUNT:
+        return {'avatar_universe': universe, 'avatar_fuels': fuels, 'avatar_element': element}
+    return None
+
+
+def save_submission(form):
+    """Store a survey submission and queue its avatar/plan generation.
+
+    Returns a dict with the email and the new response, avatar and plan ids
+    (avatar_id/plan_id are None when nothing was queued).
+    """
     # Get survey responses
-    responses = {}
-    for question in SURVEY_CONFIG['questions']:
-        qid = question['id']
-        if question['type'] == 'checkbox':
-            responses[qid] = request.form.getlist(qid)
-        elif question['type'] == 'radio_with_other':
-            value = request.form.get(qid, '')
-            if value == '__other__':
-                # Use the custom text from the "Other" field
-                value = request.form.get(f'{qid}_other_text', '').strip()
-            responses[qid] = value
-        elif question['type'] == 'multi_select_exact':
-            values = request.form.getlist(qid)
-            # Validate exact count if provided
-            if values:
-                expected_count = question.get('select_count', 3)
-                if len(values) != expected_count:
-                    print(f"Warning: {qid} has {len(values)} items, expected {expected_count}")
-                    values = []  # Clear invalid data
-            responses[qid] = values
-        else:
-            responses[qid] = request.form.get(qid, '')
+    responses = {qid: read_answer(form) for qid, read_answer in ANSWER_READERS.items()}
 
     # Get email and selfie
-    email = request.form.get('email', '').lower().strip()
-    selfie_data = request.form.get('selfie_data', '')
+    email = form.get('email', '').lower().strip()
+    selfie_data = form.get('selfie_data', '')
 
     # Extract preferences for avatar generation
-    preferences = None
-    if (responses.get('avatar_universe') and
-        responses.get('avatar_fuels') and len(responses.get('avatar_fuels', [])) == 2 and
-        responses.get('avatar_element')):
-        preferences = {
-            'avatar_universe': responses['avatar_universe'],
-            'avatar_fuels': responses['avatar_fuels'],
-            'avatar_element': responses['avatar_element']
-        }
-        print(f"[SUBMIT] Extracted preferences: {preferences}")
+    preferences = extract_avatar_preferences(responses)
+    if preferences:
+        logger.debug("[SUBMIT] Extracted preferences: %s", preferences)
 
     # Save response to database
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        'INSERT INTO responses (email, data, selfie_data) VALUES (%s, %s, %s) RETURNING id',
-        (email, json.dumps(responses), selfie_data if selfie_data else None)
-    )
-    response_id = cur.fetchone()['id']
-    conn.commit()
-
-    # Track what we're generating
-    avatar_queued = False
-    plan_queued = False
-
-    # Check if we should generate an avatar
-    if email and selfie_data:
-        avatar_count = get_avatar_count(email)
-        if avatar_count < MAX_AVATARS_PER_EMAIL:
-            # Create avatar record
-            avatar_id = str(uuid.uuid4())
+    with db_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            'INSERT INTO responses (email, data) VALUES (%s, %s) RETURNING id',
+            (email, json.dumps(responses))
+        )
+        response_id = cur.fetchone()['id']
+
+        # Track what we're generating
+        avatar_queued = False
+        plan_queued = False
+
+        # Check if we should generate an avatar
+        if email and selfie_data:
+            # Counted on this connection: a second checkout while holding one can
+            # starve the pool under load
+            avatar_count = get_avatar_count(email, cur)
+            if avatar_count < MAX_AVATARS_PER_EMAIL:
+                # Create avatar record
+                avatar_id = str(uuid.uuid4())
+                cur.execute(
+                    'INSERT INTO avatars (id, email, response_id, status) VALUES (%s, %s, %s, %s)',
+                    (avatar_id, email, response_id, 'pending')
+                )
+                avatar_queued = True
+
+        # Check if we should generate a vibe plan
+        wishlist_app = responses.get('wishlist_app', '').strip()
+        if email and wishlist_app:
+            plan_id = str(uuid.uuid4())
             cur.execute(
-                'INSERT INTO avatars (id, email, response_id, status) VALUES (%s, %s, %s, %s)',
-                (avatar_id, email, response_id, 'pending')
+                'INSERT INTO vibe_plans (id, email, response_id, wishlist_input, status) VALUES (%s, %s, %s, %s, %s)',
+                (plan_id, email, response_id, wishlist_app, 'pending')
             )
-            conn.commit()
-            avatar_queued = True
+            plan_queued = True
 
-            # Start background generation with preferences
-            thread = threading.Thread(
-                target=generate_avatar_async,
-                args=(avatar_id, email, selfie_data, response_id, preferences)
-            )
-            thread.daemon = True
-            thread.start()
-            print(f"[SUBMIT] Avatar generation queued for {email}")
-
-    # Check if we should generate a vibe plan
-    wishlist_app = responses.get('wishlist_app', '').strip()
-    if email and wishlist_app:
-        plan_id = str(uuid.uuid4())
-        cur.execute(
-            'INSERT INTO vibe_plans (id, email, response_id, wishlist_input, status) VALUES (%s, %s, %s, %s, %s)',
-            (plan_id, email, response_id, wishlist_app, 'pending')
-        )
+        # One commit for the response and its job rows; jobs start only after it,
+        # so each sees its own row and the email check sees both pending rows.
         conn.commit()
-        plan_queued = True
+        cur.close()
+
+    if avatar_queued or plan_queued:
+        expect_results(response_id, avatar=avatar_queued, plan=plan_queued)
 
+    if avatar_queued:
+        invalidate_avatar_count(email)
+        # Start background generation with preferences
+        run_in_background(AVATAR_EXECUTOR, generate_avatar_async, avatar_id, email,
+                          selfie_data, response_id, preferences)
+        logger.debug("[SUBMIT] Avatar generation queued for %s", email)
+
+    if plan_queued:
         # Start background plan generation
-        thread = threading.Thread(
-            target=generate_plan_async,
-            args=(plan_id, email, wishlist_app, response_id)
-        )
-        thread.daemon = True
-        thread.start()
-        print(f"[SUBMIT] Plan generation queued for {email}")
+        run_in_background(PLAN_EXECUTOR, generate_plan_async, plan_id, email,
+                          wishlist_app, response_id)
+        logger.debug("[SUBMIT] Plan generation queued for %s", email)
+
+    return {
+        'email': email,
+        'response_id': response_id,
+        'avatar_id': avatar_id if avatar_queued else None,
+        'plan_id': plan_id if plan_queued else None,
+    }
 
-    cur.close()
-    conn.close()
 
+@app.route('/submit', methods=['POST'])
+def submit():
+    submission = save_submission(request.form)
     return render_template('thanks.html',
-                          avatar_queued=avatar_queued,
-                          plan_queued=plan_queued,
-                          email=email)
+                          avatar_queued=submission['avatar_id'] is not None,
+                          plan_queued=submission['plan_id'] is not None,
+                          email=submission['email'])
+
+
+@app.route('/api/submit', methods=['POST'])
+def api_submit():
+    """Store a submission and return 202 right away; poll status_url for the avatar."""
+    submission = save_submission(request.form)
+    body = {
+        'status': 'queued',
+        'response_id': submission['response_id'],
+        'avatar_id': submission['avatar_id'],
+        'plan_id': submission['plan_id'],
+    }
+    if submission['avatar_id']:
+        body['status_url'] = url_for('avatar_status', avatar_id=submission['avatar_id'])
+    return jsonify(body), 202
+
+
+@app.route('/api/avatar/<uuid:avatar_id>/status')
+def avatar_status(avatar_id):
+    """Report an avatar's generation status for clients polling after /api/submit."""
+    with db_conn() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT status, error_message FROM avatars WHERE id = %s', (str(avatar_id),))
+        avatar = cur.fetchone()
+        cur.close()
+
+    if not avatar:
+        return jsonify({'error': 'Avatar not found'}), 404
+
+    body = {'id': str(avatar_id), 'status': avatar['status']}
+    if avatar['status'] == 'completed':
+        body['image_url'] = url_for('avatar_image', avatar_id=avatar_id)
+        body['page_url'] = url_for('view_avatar', avatar_id=avatar_id)
+    elif avatar['status'] == 'failed':
+        body['error'] = avatar['error_message']
+    return jsonify(body)
 
 
 @app.route('/avatar/<uuid:avatar_id>')
 def view_avatar(avatar_id):
     """Public page to view a generated avatar."""
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM avatars WHERE id = %s', (str(avatar_id),))
-    avatar = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_conn() as conn:
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT id, email, status, error_message, created_at, image_data IS NOT NULL AS has_image
+            FROM avatars WHERE id = %s
+        ''', (str(avatar_id),))
+        avatar = cur.fetchone()
+        cur.close()
 
     if not avatar:
         return render_template('avatar.html', error='Avatar not found'), 404
 
-    return render_template('avatar.html', avatar=avatar)
+    response = app.make_response(render_template('avatar.html', avatar=avatar))
+    if avatar['status'] == 'completed':
+        # Shared links fan out to crawlers and link previews; let caches absorb them
+        response.cache_control.public = True
+        response.cache_control.max_age = AVATAR_PAGE_MAX_AGE
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+
+@app.route('/avatar/<uuid:avatar_id>/image.png')
+def avatar_image(avatar_id):
+    """Serve the raw PNG bytes of a completed avatar.
+
+    A completed avatar's image never changes, so its id doubles as the ETag
+    and revalidations are answered without touching the database.
+    """
+    etag = str(avatar_id)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    with db_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT image_data FROM avatars WHERE id = %s AND status = 'completed'",
+                    (str(avatar_id),))
+        row = cur.fetchone()
+        cur.close()
+
+    if not row or row['image_data'] is None:
+        return Response('Avatar image not found', 404)
+
+    response = Response(bytes(row['image_data']), mimetype='image/png')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response
 
 
 @app.route('/admin')
 @require_admin
 def admin():
-    conn = get_db()
-    cur = conn.cursor()
-
-    # Get responses
-    cur.execute('SELECT * FROM responses ORDER BY submitted_at DESC')
-    rows = cur.fetchall()
-
-    responses = []
-    for row in rows:
-        responses.append({
-            'id': row['id'],
-            'email': row['email'],
-            'data': row['data'] if isinstance(row['data'], dict) else json.loads(row['data']),
-            'submitted_at': row['submitted_at']
-        })
+    with db_conn() as conn:
+        cur = conn.cursor()
+
+        # Get responses (only the columns the page shows, not legacy selfie data);
+        # data is JSONB, so psycopg2 already hands it back as a dict
+        cur.execute('SELECT id, email, data, submitted_at FROM responses ORDER BY submitted_at DESC')
+        responses = cur.fetchall()
 
-    # Get avatars
-    cur.execute('SELECT * FROM avatars ORDER BY created_at DESC')
-    avatars = cur.fetchall()
+        # Get avatars
+        cur.execute('''
+            SELECT id, email, response_id, status, error_message, created_at, completed_at,
+                   image_data IS NOT NULL AS has_image
+            FROM avatars ORDER BY created_at DESC
+        ''')
+        avatars = cur.fetchall()
+
+        # Count answers per (question, value) in the database so the stats below
+        # scale with the number of distinct answers, not the number of responses
+        cur.execute('''
+            SELECT answer.key AS qid, answer.value AS value, COUNT(*) AS count
+            FROM responses, jsonb_each_text(responses.data) AS answer
+            WHERE answer.key = ANY(%s)
+            GROUP BY answer.key, answer.value
+        ''', (COUNTED_QUESTION_IDS,))
+        answer_counts = {}
+        for row in cur.fetchall():
+            answer_counts.setdefault(row['qid'], {})[row['value']] = row['count']
 
-    cur.close()
-    conn.close()
+        cur.close()
 
     # Calculate statistics for charts
     stats = {}
     mc_stats = {}
     text_responses = []
 
-    for question in SURVEY_CONFIG['questions']:
+    for question in RATING_QUESTIONS:
         qid = question['id']
+        max_rating = question.get('max_rating', 10)
+        # Initialize distribution with all possible values
+        distribution = dict.fromkeys(range(1, max_rating + 1), 0)
+        total = count = 0
+        low = high = None
+        for val, n in answer_counts.get(qid, {}).items():
+            try:
+                int_val = int(val)
+            except (ValueError, TypeError):
+                continue
+            total += int_val * n
+            count += n
+            low = int_val if low is None else min(low, int_val)
+            high = int_val if high is None else max(high, int_val)
+            if 1 <= int_val <= max_rating:
+                distribution[int_val] += n
+        if count:
+            stats[qid] = {
+                'average': round(total / count, 1),
+                'count': count,
+                'min': low,
+                'max': high,
+                'distribution': distribution
+            }
+        else:
+            stats[qid] = {'average': 0, 'count': 0, 'min': 0, 'max': 0, 'distribution': distribution}
 
-        if question['type'] == 'rating':
-            values = []
-            max_rating = question.get('max_rating', 10)
-            # Initialize distribution with all possible values
-            distribution = {i: 0 for i in range(1, max_rating + 1)}
-            for resp in responses:
-                val = resp['data'].get(qid)
-                if val:
-                    try:
-                        int_val = int(val)
-                        values.append(int_val)
-                        if 1 <= int_val <= max_rating:
-                            distribution[int_val] += 1
-                    except (ValueError, TypeError):
-                        pass
-            if values:
-                stats[qid] = {
-                    'average': round(sum(values) / len(values), 1),
-                    'count': len(values),
-                    'min': min(values),
-                    'max': max(values),
-                    'distribution': distribution
-                }
-            else:
-                stats[qid] = {'average': 0, 'count': 0, 'min': 0, 'max': 0, 'distribution': distribution}
-
-        elif question['type'] == 'multiple_choice':
-            counts = {opt: 0 for opt in question['options']}
-            for resp in responses:
-                val = resp['data'].get(qid)
-                if val in counts:
-                    counts[val] += 1
-            mc_stats[qid] = counts
-
-        elif question['type'] == 'textarea':
-            for resp in responses:
-                val = resp['data'].get(qid, '').strip()
-                if val:
-                    text_responses.append(val)
+    for question in MULTIPLE_CHOICE_QUESTIONS:
+        qid = question['id']
+        counts = {opt: 0 for opt in question['options']}
+        for val, n in answer_counts.get(qid, {}).items():
+            if val in counts:
+                counts[val] += n
+        mc_stats[qid] = counts
+
+    for qid in TEXT_QUESTION_IDS:
+        for resp in responses:
+            val = resp['data'].get(qid, '').strip()
+            if val:
+                text_responses.append(val)
 
     return render_template('admin.html', responses=responses, config=SURVEY_CONFIG,
                           stats=stats, mc_stats=mc_stats, text_responses=text_responses,
@@ -1521,14 +2306,14 @@ def admin():
 @app.route('/admin/delete/<int:response_id>', methods=['POST'])
 @require_admin
 def delete_response(response_id):
-    conn = get_db()
-    cur = conn.cursor()
-    # Delete associated avatars first
-    cur.execute('DELETE FROM avatars WHERE response_id = %s', (response_id,))
-    cur.execute('DELETE FROM responses WHERE id = %s', (response_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_conn() as conn:
+        cur = conn.cursor()
+        # Delete associated avatars first
+        cur.execute('DELETE FROM avatars WHERE response_id = %s', (response_id,))
+        cur.execute('DELETE FROM responses WHERE id = %s', (response_id,))
+        conn.commit()
+        cur.close()
+    invalidate_avatar_count()
     return redirect(url_for('admin'))
 
 
@@ -1536,12 +2321,12 @@ def delete_response(response_id):
 @require_admin
 def delete_avatar(avatar_id):
     """Delete a failed avatar so user can retry."""
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('DELETE FROM avatars WHERE id = %s', (str(avatar_id),))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_conn() as conn:
+        cur = conn.cursor()
+        cur.execute('DELETE FROM avatars WHERE id = %s', (str(avatar_id),))
+        conn.commit()
+        cur.close()
+    invalidate_avatar_count()
     return redirect(url_for('admin'))
 
 
@@ -1549,12 +2334,12 @@ def delete_avatar(avatar_id):
 @require_admin
 def clear_failed_avatars():
     """Delete all failed avatars."""
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM avatars WHERE status = 'failed'")
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM avatars WHERE status = 'failed'")
+        conn.commit()
+        cur.close()
+    invalidate_avatar_count()
     return redirect(url_for('admin'))
 
 
@@ -1562,15 +2347,14 @@ def clear_failed_avatars():
 @require_admin
 def clear_all_data():
     """Delete all responses, avatars, and vibe plans. Use for testing cleanup."""
-    conn = get_db()
-    cur = conn.cursor()
-    # Delete in order to respect foreign keys
-    cur.execute('DELETE FROM vibe_plans')
-    cur.execute('DELETE FROM avatars')
-    cur.execute('DELETE FROM responses')
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_conn() as conn:
+        cur = conn.cursor()
+        # Ids keep counting up (no RESTART IDENTITY): other workers may still hold
+        # per-response state keyed on old ids
+        cur.execute('TRUNCATE vibe_plans, avatars, responses')
+        conn.commit()
+        cur.close()
+    invalidate_avatar_count()
     return redirect(url_for('admin'))
 
 
@@ -0,0 +1,97 @@
+"""One-off schema migrations for databases created by older versions of the app.
+
+init_db() runs in every worker at import and only makes additive, idempotent
+changes. The type changes and column drops below rewrite or delete data, so
+they are run once, by hand, while the app is stopped:
+
+    DATABASE_URL=... python migrate_db.py                     # type conversions only
+    DATABASE_URL=... python migrate_db.py --drop-selfie-data  # also drop responses.selfie_data
+
+Each step checks the current column type first, so running the script twice
+is harmless. Everything runs in one transaction.
+"""
+import argparse
+import logging
+import os
+import sys
+
+import psycopg2
+
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+
+def column_type(cur, table, column):
+    """Return the column's information_schema data_type, or None if it doesn't exist."""
+    cur.execute('''
+        SELECT data_type FROM information_schema.columns
+        WHERE table_name = %s AND column_name = %s
+    ''', (table, column))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def migrate(conn, drop_selfie_data=False):
+    """Apply every pending migration on conn and commit."""
+    cur = conn.cursor()
+    # Block app writes to the affected tables until the migration commits
+    cur.execute('LOCK TABLE responses, avatars IN ACCESS EXCLUSIVE MODE')
+
+    # Older deployments stored data as text; psycopg2 only returns dicts for JSONB
+    data_type = column_type(cur, 'responses', 'data')
+    if data_type and data_type != 'jsonb':
+        logger.info("Converting responses.data from %s to jsonb", data_type)
+        cur.execute('ALTER TABLE responses ALTER COLUMN data TYPE JSONB USING data::jsonb')
+
+    # Avatars created before image_data was stored as raw bytes
+    if column_type(cur, 'avatars', 'image_data') == 'text':
+        logger.info("Converting avatars.image_data from base64 text to bytea")
+        cur.execute("ALTER TABLE avatars ALTER COLUMN image_data TYPE BYTEA USING decode(image_data, 'base64')")
+
+    # Selfies are no longer written; keep a copy of the old ones before dropping them
+    if drop_selfie_data and column_type(cur, 'responses', 'selfie_data'):
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS responses_selfie_backup (
+                response_id INTEGER PRIMARY KEY,
+                selfie_data TEXT NOT NULL
+            )
+        ''')
+        cur.execute('''
+            INSERT INTO responses_selfie_backup (response_id, selfie_data)
+            SELECT id, selfie_data FROM responses WHERE selfie_data IS NOT NULL
+            ON CONFLICT (response_id) DO NOTHING
+        ''')
+        logger.info("Backed up %s selfie(s) to responses_selfie_backup", cur.rowcount)
+        cur.execute('ALTER TABLE responses DROP COLUMN selfie_data')
+        logger.info("Dropped responses.selfie_data")
+
+    conn.commit()
+    cur.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--drop-selfie-data', action='store_true',
+                        help='back up responses.selfie_data to responses_selfie_backup, then drop the column')
+    args = parser.parse_args(argv)
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        logger.error("DATABASE_URL not set")
+        return 1
+
+    conn = psycopg2.connect(database_url)
+    try:
+        migrate(conn, drop_selfie_data=args.drop_selfie_data)
+    except Exception:
+        conn.rollback()
+        logger.exception("Migration failed, nothing was changed")
+        return 1
+    finally:
+        conn.close()
+    logger.info("Migration complete")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
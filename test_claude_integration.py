@@ -19,7 +19,7 @@ class TestGenerateAvatarPrompt(unittest.TestCase):
 
             result = generate_avatar_prompt(
                 universe='cyberpunk',
-                fuels=['gaming', 'code', 'coffee'],
+                fuels=['gaming', 'code'],
                 element='lightning'
             )
 
@@ -36,7 +36,7 @@ class TestGenerateAvatarPrompt(unittest.TestCase):
 
             result = generate_avatar_prompt(
                 universe='invalid_universe',
-                fuels=['gaming', 'code', 'coffee'],
+                fuels=['gaming', 'code'],
                 element='lightning'
             )
 
@@ -51,7 +51,7 @@ class TestGenerateAvatarPrompt(unittest.TestCase):
 
             result = generate_avatar_prompt(
                 universe='cyberpunk',
-                fuels=['gaming', 'code'],  # Only 2, need 3
+                fuels=['gaming', 'code', 'coffee'],  # 3, need exactly 2
                 element='lightning'
             )
 
@@ -66,7 +66,7 @@ class TestGenerateAvatarPrompt(unittest.TestCase):
 
             result = generate_avatar_prompt(
                 universe='cyberpunk',
-                fuels=['gaming', 'code', 'coffee'],
+                fuels=['gaming', 'code'],
                 element='invalid_element'
             )
 
@@ -81,7 +81,7 @@ class TestGenerateAvatarPrompt(unittest.TestCase):
 
             result = generate_avatar_prompt(
                 universe='cyberpunk',
-                fuels=['gaming', 'code', 'coffee'],
+                fuels=['gaming', 'code'],
                 element='lightning'
             )
 
@@ -103,7 +103,7 @@ class TestGenerateAvatarPrompt(unittest.TestCase):
 
             result = generate_avatar_prompt(
                 universe='cyberpunk',
-                fuels=['gaming', 'code', 'coffee'],
+                fuels=['gaming', 'code'],
                 element='lightning'
             )
 
@@ -123,7 +123,7 @@ class TestGenerateAvatarPrompt(unittest.TestCase):
 
             result = generate_avatar_prompt(
                 universe='cyberpunk',
-                fuels=['gaming', 'code', 'coffee'],
+                fuels=['gaming', 'code'],
                 element='lightning'
             )
 
@@ -142,13 +142,49 @@ class TestGenerateAvatarPrompt(unittest.TestCase):
 
             result = generate_avatar_prompt(
                 universe='cyberpunk',
-                fuels=['gaming', 'code', 'coffee'],
+                fuels=['gaming', 'code'],
                 element='lightning'
             )
 
             assert result == FALLBACK_AVATAR_PROMPT
 
 
+class TestGetAvatarPrompt(unittest.TestCase):
+
+    def setUp(self):
+        from app import _personalized_avatar_prompt
+        _personalized_avatar_prompt.cache_clear()
+
+    tearDown = setUp
+
+    def test_reuses_prompt_for_same_preferences(self):
+        """Same preferences (in any fuel order) should only call Claude once."""
+        from app import get_avatar_prompt
+
+        with patch('app.generate_avatar_prompt') as mock_generate:
+            mock_generate.return_value = "A detailed prompt for a cyberpunk hero with neon lighting and electric effects..."
+
+            first = get_avatar_prompt('cyberpunk', ['gaming', 'code'], 'lightning')
+            second = get_avatar_prompt('cyberpunk', ['code', 'gaming'], 'lightning')
+
+            assert first == second
+            mock_generate.assert_called_once_with('cyberpunk', ['code', 'gaming'], 'lightning')
+
+    def test_fallback_is_not_cached(self):
+        """A fallback result should be retried on the next call."""
+        from app import get_avatar_prompt, FALLBACK_AVATAR_PROMPT
+
+        with patch('app.generate_avatar_prompt') as mock_generate:
+            mock_generate.side_effect = [
+                FALLBACK_AVATAR_PROMPT,
+                "A detailed prompt for a cyberpunk hero with neon lighting and electric effects...",
+            ]
+
+            assert get_avatar_prompt('cyberpunk', ['gaming', 'code'], 'lightning') == FALLBACK_AVATAR_PROMPT
+            assert get_avatar_prompt('cyberpunk', ['gaming', 'code'], 'lightning') != FALLBACK_AVATAR_PROMPT
+            assert mock_generate.call_count == 2
+
+
 class TestGenerateVibePlan(unittest.TestCase):
 
     def test_valid_input_returns_plan(self):
@@ -271,6 +307,35 @@ class TestGenerateVibePlan(unittest.TestCase):
             assert success is False
             assert content == VIBE_PLAN_ERROR_MESSAGE
 
+    def test_system_prompt_is_cacheable(self):
+        """Static instructions should go in a cached system block, not the user message."""
+        from app import generate_vibe_plan, VIBE_PLAN_SYSTEM_PROMPT
+
+        with patch('app.get_claude_client') as mock_get_client:
+            mock_client = Mock()
+            mock_client.messages.create.return_value = Mock(content=[Mock(text="short")])
+            mock_get_client.return_value = mock_client
+
+            generate_vibe_plan("ServiceNow")
+
+            kwargs = mock_client.messages.create.call_args.kwargs
+            assert kwargs['system'] == [{
+                "type": "text",
+                "text": VIBE_PLAN_SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"},
+            }]
+            user_content = kwargs['messages'][0]['content']
+            assert user_content.endswith('"ServiceNow"')
+            assert '<h3>' not in user_content
+
+    def test_system_prompt_exceeds_cache_minimum(self):
+        """The cached system block must be at least 1024 tokens or it is never cached."""
+        from app import VIBE_PLAN_SYSTEM_PROMPT
+
+        # English prose averages ~4 characters per token (HTML markup packs
+        # more tokens per character), so this is a conservative lower bound.
+        assert len(VIBE_PLAN_SYSTEM_PROMPT) // 4 > 1024 * 1.25
+
 
 class TestClaudeClientInitialization(unittest.TestCase):
 
@@ -311,5 +376,34 @@ class TestClaudeClientInitialization(unittest.TestCase):
         app._claude_client = None
 
 
+class TestGeminiClientInitialization(unittest.TestCase):
+
+    def test_client_reused_across_calls(self):
+        """Gemini client should be constructed once and then reused."""
+        import app
+
+        app._gemini_client = None
+
+        with patch('app.GEMINI_API_KEY', 'test-key'):
+            with patch('app.genai.Client') as mock_client_cls:
+                mock_client_cls.return_value = Mock()
+                first = app.get_gemini_client()
+                second = app.get_gemini_client()
+
+                mock_client_cls.assert_called_once_with(api_key='test-key')
+                assert first is second
+
+        app._gemini_client = None
+
+    def test_client_none_without_api_key(self):
+        """Client should be None when no API key."""
+        import app
+
+        app._gemini_client = None
+
+        with patch('app.GEMINI_API_KEY', None):
+            assert app.get_gemini_client() is None
+
+
 if __name__ == '__main__':
     unittest.main()
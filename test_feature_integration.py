@@ -2,252 +2,898 @@
 
 Tests for email coordination, combined email sending, and task coordination.
 """
+import base64
+import time
 import unittest
 from unittest.mock import Mock, patch, MagicMock
 
+from app import check_and_send_email, generate_plan_async, get_pregenerated_plan, send_combined_email
+
 
 class TestCheckAndSendEmail(unittest.TestCase):
     """Tests for check_and_send_email coordination logic."""
 
-    def test_waits_when_avatar_pending(self):
-        """Should not send email when avatar is still pending."""
-        from app import check_and_send_email
+    # (description, avatar_id, avatar_status, plan_status, plan_content, expected send args or None)
+    CASES = [
+        ('waits when avatar pending', '123', 'pending', None, None, None),
+        ('waits when plan pending', None, None, 'pending', None, None),
+        ('waits when both pending', '123', 'pending', 'pending', None, None),
+        ('sends avatar when no plan', '123', 'completed', None, None,
+         ('test@example.com', '123', None)),
+        ('sends plan when no avatar', None, None, 'completed', '<h3>Plan</h3>',
+         ('test@example.com', None, '<h3>Plan</h3>')),
+        ('sends both when both completed', '123', 'completed', 'completed', '<h3>Plan</h3>',
+         ('test@example.com', '123', '<h3>Plan</h3>')),
+        ('sends plan only when avatar failed', '123', 'failed', 'completed', '<h3>Plan</h3>',
+         ('test@example.com', None, '<h3>Plan</h3>')),
+        ('sends nothing when both failed', '123', 'failed', 'failed', None, None),
+    ]
+
+    def setUp(self):
+        patcher = patch.dict('app._sent_emails', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_coordination_cases(self):
+        """Should send only once nothing is pending, and only the successful parts."""
+        for description, avatar_id, avatar_status, plan_status, plan_content, expected in self.CASES:
+            with self.subTest(description), \
+                    patch.dict('app._sent_emails', clear=True), \
+                    patch('app.get_db') as mock_db, \
+                    patch('app.send_combined_email') as mock_send:
+                mock_db.return_value.cursor.return_value.fetchone.return_value = {
+                    'avatar_id': avatar_id, 'avatar_status': avatar_status,
+                    'plan_status': plan_status, 'plan_content': plan_content
+                }
 
-        with patch('app.get_db') as mock_db:
-            mock_cursor = MagicMock()
-            mock_conn = MagicMock()
-            mock_conn.cursor.return_value = mock_cursor
-            mock_db.return_value = mock_conn
+                check_and_send_email(1, 'test@example.com')
 
-            # Avatar pending, no plan
-            mock_cursor.fetchone.side_effect = [
-                {'id': '123', 'status': 'pending', 'image_data': None},
-                None
-            ]
+                if expected is None:
+                    mock_send.assert_not_called()
+                else:
+                    mock_send.assert_called_once_with(*expected)
+
+    @patch('app.send_combined_email')
+    @patch('app.get_db')
+    def test_no_email_when_already_claimed(self, mock_db, mock_send):
+        """Should not send when another task already claimed the email send."""
+        mock_cursor = mock_db.return_value.cursor.return_value
+        # Both completed, but the email_sent_at claim returns no row
+        mock_cursor.fetchone.side_effect = [
+            {
+                'avatar_id': '123', 'avatar_status': 'completed',
+                'plan_status': 'completed', 'plan_content': '<h3>Plan</h3>'
+            },
+            None
+        ]
+
+        check_and_send_email(1, 'test@example.com')
+        mock_send.assert_not_called()
+
+        claim_sql = mock_cursor.execute.call_args_list[1][0][0]
+        self.assertIn('email_sent_at IS NULL', claim_sql)
+
+    @patch('app.send_combined_email', return_value=False)
+    @patch('app.get_db')
+    def test_failed_send_releases_claim(self, mock_db, mock_send):
+        """The claim should be undone when the email fails to send."""
+        mock_cursor = mock_db.return_value.cursor.return_value
+        mock_cursor.fetchone.side_effect = [
+            {
+                'avatar_id': '123', 'avatar_status': 'completed',
+                'plan_status': 'completed', 'plan_content': '<h3>Plan</h3>'
+            },
+            {'id': 1},
+        ]
+
+        check_and_send_email(1, 'test@example.com')
+
+        self.assertIn('email_sent_at = NULL', mock_cursor.execute.call_args_list[2][0][0])
+
+    @patch('app.send_combined_email')
+    @patch('app.get_db')
+    def test_second_call_short_circuits(self, mock_db, mock_send):
+        """A call after the email went out should not touch the database."""
+        mock_cursor = mock_db.return_value.cursor.return_value
+        mock_cursor.fetchone.side_effect = [
+            {
+                'avatar_id': '123', 'avatar_status': 'completed',
+                'plan_status': 'completed', 'plan_content': '<h3>Plan</h3>'
+            },
+            {'id': 1},
+        ]
+
+        check_and_send_email(1, 'test@example.com')
+        check_and_send_email(1, 'test@example.com')
+
+        mock_send.assert_called_once_with('test@example.com', '123', '<h3>Plan</h3>')
+        mock_db.assert_called_once()
+        self.assertEqual(mock_cursor.execute.call_count, 2)
+
+    @patch('app.send_combined_email')
+    @patch('app.get_db')
+    def test_remembers_response_already_sent(self, mock_db, mock_send):
+        """Once the status query finds the email sent, later calls skip it."""
+        # email_sent_at is set, so the join returns no row
+        mock_db.return_value.cursor.return_value.fetchone.return_value = None
+
+        check_and_send_email(1, 'test@example.com')
+        check_and_send_email(1, 'test@example.com')
+
+        mock_send.assert_not_called()
+        mock_db.assert_called_once()
+
+
+class TestTaskFinished(unittest.TestCase):
+    """Tests for the in-process completion barrier."""
+
+    def setUp(self):
+        for patcher in (patch.dict('app._pending_sends', clear=True),
+                        patch.dict('app._sent_emails', clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _mock_db(self, mock_db, claimed=True):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = {'id': 1} if claimed else None
+        mock_conn = MagicMock()
+        mock_conn.cursor.return_value = mock_cursor
+        mock_db.return_value = mock_conn
+        return mock_cursor
+
+    def test_last_task_sends_with_collected_results(self):
+        """The second job to finish should send both results without re-reading them."""
+        from app import expect_results, task_finished
+
+        expect_results(1, avatar=True, plan=True)
+        with patch('app.get_db') as mock_db, patch('app.send_combined_email') as mock_send:
+            mock_cursor = self._mock_db(mock_db)
+
+            task_finished(1, 'test@example.com', 'avatar', 'avatar-123')
+            mock_send.assert_not_called()
+            mock_db.assert_not_called()
+
+            task_finished(1, 'test@example.com', 'plan', '<h3>Plan</h3>')
+
+        mock_send.assert_called_once_with('test@example.com', 'avatar-123', '<h3>Plan</h3>')
+        self.assertEqual(mock_cursor.execute.call_count, 1)
+        self.assertIn('email_sent_at', mock_cursor.execute.call_args[0][0])
+
+    def test_only_expected_tasks_are_awaited(self):
+        """A plan-only submission should send as soon as the plan finishes."""
+        from app import expect_results, task_finished
+
+        expect_results(1, plan=True)
+        with patch('app.get_db') as mock_db, patch('app.send_combined_email') as mock_send:
+            self._mock_db(mock_db)
+            task_finished(1, 'test@example.com', 'plan', '<h3>Plan</h3>')
+
+        mock_send.assert_called_once_with('test@example.com', None, '<h3>Plan</h3>')
+
+    def test_all_failed_sends_nothing(self):
+        """No email should be sent when every job failed."""
+        from app import expect_results, task_finished
+
+        expect_results(1, avatar=True, plan=True)
+        with patch('app.get_db') as mock_db, patch('app.send_combined_email') as mock_send:
+            task_finished(1, 'test@example.com', 'avatar', None)
+            task_finished(1, 'test@example.com', 'plan', None)
+
+        mock_send.assert_not_called()
+        mock_db.assert_not_called()
 
-            with patch('app.send_combined_email') as mock_send:
-                check_and_send_email(1, 'test@example.com')
-                mock_send.assert_not_called()
+    def test_failed_send_releases_claim(self):
+        """An email that did not go out should not stay marked as sent."""
+        from app import _sent_emails, expect_results, task_finished
 
-    def test_waits_when_plan_pending(self):
-        """Should not send email when plan is still pending."""
-        from app import check_and_send_email
+        expect_results(1, plan=True)
+        with patch('app.get_db') as mock_db, \
+                patch('app.send_combined_email', return_value=False):
+            mock_cursor = self._mock_db(mock_db)
+            task_finished(1, 'test@example.com', 'plan', '<h3>Plan</h3>')
+
+        release_sql, release_params = mock_cursor.execute.call_args_list[1][0]
+        self.assertIn('email_sent_at = NULL', release_sql)
+        self.assertEqual(release_params, (1,))
+        self.assertNotIn(1, _sent_emails)
 
-        with patch('app.get_db') as mock_db:
-            mock_cursor = MagicMock()
-            mock_conn = MagicMock()
-            mock_conn.cursor.return_value = mock_cursor
-            mock_db.return_value = mock_conn
+    def test_unregistered_response_falls_back_to_database(self):
+        """Jobs this process didn't register should coordinate through the database."""
+        from app import task_finished
 
-            # No avatar, plan pending
-            mock_cursor.fetchone.side_effect = [
-                None,
-                {'id': '456', 'status': 'pending', 'plan_content': None}
-            ]
+        with patch('app.check_and_send_email') as mock_check:
+            task_finished(1, 'test@example.com', 'avatar', 'avatar-123')
 
-            with patch('app.send_combined_email') as mock_send:
-                check_and_send_email(1, 'test@example.com')
-                mock_send.assert_not_called()
+        mock_check.assert_called_once_with(1, 'test@example.com')
 
-    def test_waits_when_both_pending(self):
-        """Should not send email when both avatar and plan are pending."""
-        from app import check_and_send_email
 
-        with patch('app.get_db') as mock_db:
-            mock_cursor = MagicMock()
-            mock_conn = MagicMock()
-            mock_conn.cursor.return_value = mock_cursor
-            mock_db.return_value = mock_conn
+class TestSendCombinedEmail(unittest.TestCase):
+    """Tests for send_combined_email function."""
 
-            # Both pending
-            mock_cursor.fetchone.side_effect = [
-                {'id': '123', 'status': 'pending', 'image_data': None},
-                {'id': '456', 'status': 'pending', 'plan_content': None}
-            ]
+    def tearDown(self):
+        from app import _email_batcher
+        _email_batcher.close(timeout=5)
 
-            with patch('app.send_combined_email') as mock_send:
-                check_and_send_email(1, 'test@example.com')
-                mock_send.assert_not_called()
+    @patch('app.resend')
+    @patch('app.RESEND_API_KEY', None)
+    def test_skips_when_no_resend_key(self, mock_resend):
+        """Should skip email when RESEND_API_KEY not set."""
+        self.assertFalse(send_combined_email('test@example.com', '123', '<h3>Plan</h3>'))
+        mock_resend.Emails.send.assert_not_called()
+
+    @patch('app.resend')
+    @patch('app.RESEND_API_KEY', 'test-key')
+    def test_reports_send_result(self, mock_resend):
+        """Should return whether the email went out so callers can release their claim."""
+        self.assertTrue(send_combined_email('test@example.com', '123', None))
+
+        mock_resend.Emails.send.side_effect = RuntimeError('invalid recipient')
+        self.assertFalse(send_combined_email('bad@', '123', None))
+
+    SUBJECT_CASES = [
+        # (avatar_id, plan_content, expected subject)
+        ('123', None, 'Your Vibe Coding Wizard Avatar is Ready!'),
+        (None, '<h3>Plan</h3>', 'Your Vibe Coding Kickstart Plan is Ready!'),
+        ('123', '<h3>Plan</h3>', 'Your Wizard Avatar & Vibe Coding Plan are Ready!'),
+    ]
+
+    @patch('app.resend')
+    @patch('app.RESEND_API_KEY', 'test-key')
+    def test_subject_matches_results(self, mock_resend):
+        """Should pick the subject from which of avatar and plan are present."""
+        for avatar_id, plan_content, subject in self.SUBJECT_CASES:
+            with self.subTest(avatar_id=avatar_id, plan_content=plan_content):
+                mock_resend.reset_mock()
+                send_combined_email('test@example.com', avatar_id, plan_content)
+                call_args = mock_resend.Emails.send.call_args[0][0]
+                self.assertEqual(call_args['subject'], subject)
 
-    def test_sends_when_avatar_completed_no_plan(self):
-        """Should send email when avatar completes and no plan exists."""
-        from app import check_and_send_email
+    @patch('app.resend')
+    @patch('app.APP_URL', 'https://test.example.com')
+    @patch('app.RESEND_API_KEY', 'test-key')
+    def test_includes_avatar_link(self, mock_resend):
+        """Should include avatar link in email when avatar_id provided."""
+        send_combined_email('test@example.com', 'abc-123', None)
+        call_args = mock_resend.Emails.send.call_args[0][0]
+        self.assertIn('https://test.example.com/avatar/abc-123', call_args['html'])
 
-        with patch('app.get_db') as mock_db:
-            mock_cursor = MagicMock()
-            mock_conn = MagicMock()
-            mock_conn.cursor.return_value = mock_cursor
-            mock_db.return_value = mock_conn
+    @patch('app.resend')
+    @patch('app.RESEND_API_KEY', 'test-key')
+    def test_includes_plan_content(self, mock_resend):
+        """Should include plan content in email when provided."""
+        send_combined_email('test@example.com', None, '<h3>My Custom Plan</h3>')
+        call_args = mock_resend.Emails.send.call_args[0][0]
+        self.assertIn('<h3>My Custom Plan</h3>', call_args['html'])
+
+    @patch('app.resend')
+    @patch('app.APP_URL', 'https://test.example.com')
+    @patch('app.RESEND_API_KEY', 'test-key')
+    def test_embeds_avatar_as_cid_attachment(self, mock_resend):
+        """Should embed avatar image as a CID attachment fetched from the image URL."""
+        send_combined_email('test@example.com', 'abc-123', None)
+        call_args = mock_resend.Emails.send.call_args[0][0]
+        # Check that attachments include the avatar with CID
+        self.assertIn('attachments', call_args)
+        self.assertEqual(len(call_args['attachments']), 1)
+        self.assertEqual(call_args['attachments'][0]['path'],
+                         'https://test.example.com/avatar/abc-123/image.png')
+        self.assertNotIn('content', call_args['attachments'][0])
+        self.assertEqual(call_args['attachments'][0]['content_id'], 'avatar_image')
+        # Check that HTML references the CID
+        self.assertIn('cid:avatar_image', call_args['html'])
+
+
+class TestSendAvatarEmail(unittest.TestCase):
+    """Tests for the standalone avatar-ready email."""
+
+    def test_renders_avatar_link(self):
+        """The email body should link to the avatar page."""
+        from app import send_avatar_email
+
+        with patch('app.RESEND_API_KEY', 'test-key'), \
+                patch('app.APP_URL', 'https://survey.example.com'), \
+                patch('app.resend') as mock_resend:
+            send_avatar_email('test@example.com', 'abc-123')
+
+            html = mock_resend.Emails.send.call_args[0][0]['html']
+            self.assertIn('href="https://survey.example.com/avatar/abc-123"', html)
+            self.assertIn('View Your Avatar', html)
+
+
+class TestEmailBatcher(unittest.TestCase):
+    """Tests for the outbound email batcher."""
+
+    def test_combines_emails_within_window(self):
+        """Emails submitted within the window should go out as one batch request."""
+        from app import EmailBatcher
+
+        batcher = EmailBatcher(max_size=50, window=0.2)
+        self.addCleanup(batcher.close, 5)
+        with patch('app.resend') as mock_resend:
+            futures = [batcher.submit({'to': f'user{i}@example.com'}) for i in range(3)]
+            for future in futures:
+                future.result(timeout=5)
+
+            mock_resend.Batch.send.assert_called_once()
+            sent = mock_resend.Batch.send.call_args[0][0]
+            self.assertEqual([p['to'] for p in sent],
+                             ['user0@example.com', 'user1@example.com', 'user2@example.com'])
+            mock_resend.Emails.send.assert_not_called()
+
+    def test_single_email_uses_regular_send(self):
+        """A lone email should be sent with the regular endpoint."""
+        from app import EmailBatcher
+
+        batcher = EmailBatcher(max_size=50, window=0.01)
+        self.addCleanup(batcher.close, 5)
+        with patch('app.resend') as mock_resend:
+            batcher.submit({'to': 'test@example.com'}).result(timeout=5)
+
+            mock_resend.Emails.send.assert_called_once_with({'to': 'test@example.com'})
+            mock_resend.Batch.send.assert_not_called()
+
+    def test_send_error_propagates_to_callers(self):
+        """A failed batch should fail every caller's future."""
+        from app import EmailBatcher
+
+        batcher = EmailBatcher(max_size=50, window=0.01)
+        self.addCleanup(batcher.close, 5)
+        with patch('app.resend') as mock_resend:
+            mock_resend.Emails.send.side_effect = RuntimeError('resend down')
+            future = batcher.submit({'to': 'test@example.com'})
+
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+
+    def test_rejected_batch_falls_back_to_individual_sends(self):
+        """One bad recipient should only fail its own email, not the whole batch."""
+        from resend.exceptions import ValidationError
+        from app import EmailBatcher
+
+        batcher = EmailBatcher(max_size=50, window=0.2)
+        self.addCleanup(batcher.close, 5)
+
+        def send(params):
+            if params['to'] == 'bad@':
+                raise RuntimeError('invalid recipient')
+
+        with patch('app.resend') as mock_resend:
+            mock_resend.Batch.send.side_effect = ValidationError('invalid `to` field', 'validation_error', 422)
+            mock_resend.Emails.send.side_effect = send
+            futures = [batcher.submit({'to': to}) for to in ('a@example.com', 'bad@', 'b@example.com')]
+
+            self.assertIsNone(futures[0].result(timeout=5))
+            with self.assertRaises(RuntimeError):
+                futures[1].result(timeout=5)
+            self.assertIsNone(futures[2].result(timeout=5))
+            self.assertEqual(mock_resend.Emails.send.call_count, 3)
+
+    def test_possibly_accepted_batch_is_not_resent(self):
+        """Transport errors and 5xx fail every caller instead of risking duplicates."""
+        from resend.exceptions import ResendError
+        from app import EmailBatcher
+
+        for error in (RuntimeError('Request failed: ReadTimeout'),
+                      ResendError(500, 'internal_server_error', 'boom', '')):
+            with self.subTest(error=error), patch('app.resend') as mock_resend:
+                batcher = EmailBatcher(max_size=50, window=0.2)
+                self.addCleanup(batcher.close, 5)
+                mock_resend.Batch.send.side_effect = error
+                futures = [batcher.submit({'to': f'user{i}@example.com'}) for i in range(3)]
+
+                for future in futures:
+                    with self.assertRaises(type(error)):
+                        future.result(timeout=5)
+                mock_resend.Emails.send.assert_not_called()
 
-            # Avatar completed, no plan
-            mock_cursor.fetchone.side_effect = [
-                {'id': '123', 'status': 'completed', 'image_data': 'base64...'},
-                None
-            ]
+    def test_close_stops_flush_thread(self):
+        """close() should send queued emails and stop the background thread."""
+        from app import EmailBatcher
 
-            with patch('app.send_combined_email') as mock_send:
-                check_and_send_email(1, 'test@example.com')
-                mock_send.assert_called_once_with('test@example.com', '123', None)
+        batcher = EmailBatcher(max_size=50, window=0.01)
+        with patch('app.resend'):
+            future = batcher.submit({'to': 'test@example.com'})
+            thread = batcher._thread
+            batcher.close(timeout=5)
 
-    def test_sends_when_plan_completed_no_avatar(self):
-        """Should send email when plan completes and no avatar exists."""
-        from app import check_and_send_email
+        self.assertIsNone(future.result(timeout=0))
+        self.assertFalse(thread.is_alive())
 
-        with patch('app.get_db') as mock_db:
-            mock_cursor = MagicMock()
-            mock_conn = MagicMock()
-            mock_conn.cursor.return_value = mock_cursor
-            mock_db.return_value = mock_conn
 
-            # No avatar, plan completed
-            mock_cursor.fetchone.side_effect = [
-                None,
-                {'id': '456', 'status': 'completed', 'plan_content': '<h3>Plan</h3>'}
-            ]
+class TestRunInBackground(unittest.TestCase):
+    """Tests for the background job helper."""
 
-            with patch('app.send_combined_email') as mock_send:
-                check_and_send_email(1, 'test@example.com')
-                mock_send.assert_called_once_with('test@example.com', None, '<h3>Plan</h3>')
+    def test_returns_job_result(self):
+        """The returned Future should resolve to the job's return value."""
+        from app import PLAN_EXECUTOR, run_in_background
+
+        self.assertEqual(run_in_background(PLAN_EXECUTOR, lambda a, b: a + b, 2, 3).result(timeout=5), 5)
+
+    def test_escaped_exception_is_logged(self):
+        """Exceptions escaping a job should be logged rather than lost."""
+        from concurrent.futures import Future
+        from app import _log_job_failure
+
+        future = Future()
+        future.set_exception(RuntimeError('db down'))
+        with self.assertLogs('app', level='ERROR') as logs:
+            _log_job_failure(future)
+
+        self.assertIn('Background job failed', logs.output[0])
 
-    def test_sends_when_both_completed(self):
-        """Should send combined email when both avatar and plan complete."""
-        from app import check_and_send_email
+
+class TestTokenBucket(unittest.TestCase):
+    """Tests for the outbound API rate limiter."""
+
+    def test_burst_up_to_capacity_does_not_wait(self):
+        """Calls within the bucket capacity should not block."""
+        from app import TokenBucket
+
+        bucket = TokenBucket(rate=5)
+        with patch('app.time.sleep') as mock_sleep:
+            for _ in range(5):
+                bucket.acquire()
+
+        mock_sleep.assert_not_called()
+
+    def test_waits_when_bucket_empty(self):
+        """A call beyond capacity should sleep until a token is refilled."""
+        from app import TokenBucket
+
+        bucket = TokenBucket(rate=100, capacity=1)
+        bucket.acquire()
+        start = time.monotonic()
+        bucket.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.005)
+
+
+class TestPooledResendClient(unittest.TestCase):
+    """Tests for the keep-alive Resend transport."""
+
+    def test_installed_as_default_client(self):
+        """Resend SDK should route requests through the pooled client."""
+        import resend
+        from app import PooledResendClient
+
+        self.assertIsInstance(resend.default_http_client, PooledResendClient)
+
+    def test_retries_failed_connects(self):
+        """Connection attempts should be retried by the pooled transport."""
+        import httpx
+        from app import PooledResendClient
+
+        with patch('app.httpx.HTTPTransport', wraps=httpx.HTTPTransport) as mock_transport:
+            PooledResendClient(retries=3)
+
+        self.assertEqual(mock_transport.call_args.kwargs['retries'], 3)
+
+    def test_returns_content_status_and_headers(self):
+        """Should return the (content, status, headers) tuple the SDK expects."""
+        import httpx
+        from app import PooledResendClient
+
+        def handler(request):
+            self.assertEqual(request.headers['Authorization'], 'Bearer test-key')
+            return httpx.Response(200, json={'id': 'email-1'})
+
+        client = PooledResendClient()
+        client._client = httpx.Client(transport=httpx.MockTransport(handler))
+
+        content, status, headers = client.request(
+            'post', 'https://api.resend.com/emails',
+            {'Authorization': 'Bearer test-key'}, json={'to': 'test@example.com'})
+
+        self.assertEqual(status, 200)
+        self.assertIn(b'email-1', content)
+
+    def test_transport_errors_raise_runtime_error(self):
+        """Transport failures should surface as RuntimeError like the SDK client."""
+        import httpx
+        from app import PooledResendClient
+
+        def handler(request):
+            raise httpx.ConnectError('boom', request=request)
+
+        client = PooledResendClient()
+        client._client = httpx.Client(transport=httpx.MockTransport(handler))
+
+        with self.assertRaises(RuntimeError):
+            client.request('post', 'https://api.resend.com/emails', {}, json={})
+
+
+class TestAvatarImage(unittest.TestCase):
+    """Tests for the raw avatar image route."""
+
+    def test_serves_png_bytes(self):
+        """Should return the stored avatar bytes as image/png."""
+        from app import app
 
         with patch('app.get_db') as mock_db:
             mock_cursor = MagicMock()
             mock_conn = MagicMock()
             mock_conn.cursor.return_value = mock_cursor
             mock_db.return_value = mock_conn
+            mock_cursor.fetchone.return_value = {'image_data': memoryview(b'\x89PNG-image')}
 
-            # Both completed
-            mock_cursor.fetchone.side_effect = [
-                {'id': '123', 'status': 'completed', 'image_data': 'base64...'},
-                {'id': '456', 'status': 'completed', 'plan_content': '<h3>Plan</h3>'}
-            ]
+            resp = app.test_client().get('/avatar/12345678-1234-5678-1234-567812345678/image.png')
 
-            with patch('app.send_combined_email') as mock_send:
-                check_and_send_email(1, 'test@example.com')
-                mock_send.assert_called_once_with('test@example.com', '123', '<h3>Plan</h3>')
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.mimetype, 'image/png')
+            self.assertEqual(resp.data, b'\x89PNG-image')
+            self.assertIn('immutable', resp.headers['Cache-Control'])
+            self.assertEqual(resp.headers['ETag'], '"12345678-1234-5678-1234-567812345678"')
 
-    def test_sends_when_avatar_failed_plan_completed(self):
-        """Should send plan-only email when avatar fails but plan succeeds."""
-        from app import check_and_send_email
+    def test_matching_etag_returns_304_without_query(self):
+        """A revalidation with the avatar's ETag should not hit the database."""
+        from app import app
+
+        with patch('app.get_db') as mock_db:
+            resp = app.test_client().get(
+                '/avatar/12345678-1234-5678-1234-567812345678/image.png',
+                headers={'If-None-Match': '"12345678-1234-5678-1234-567812345678"'})
+
+            self.assertEqual(resp.status_code, 304)
+            mock_db.assert_not_called()
+
+    def test_missing_avatar_returns_404(self):
+        """Should return 404 when the avatar is missing or not completed."""
+        from app import app
 
         with patch('app.get_db') as mock_db:
             mock_cursor = MagicMock()
             mock_conn = MagicMock()
             mock_conn.cursor.return_value = mock_cursor
             mock_db.return_value = mock_conn
+            mock_cursor.fetchone.return_value = None
 
-            # Avatar failed, plan completed
-            mock_cursor.fetchone.side_effect = [
-                {'id': '123', 'status': 'failed', 'image_data': None},
-                {'id': '456', 'status': 'completed', 'plan_content': '<h3>Plan</h3>'}
-            ]
+            resp = app.test_client().get('/avatar/12345678-1234-5678-1234-567812345678/image.png')
 
-            with patch('app.send_combined_email') as mock_send:
-                check_and_send_email(1, 'test@example.com')
-                mock_send.assert_called_once_with('test@example.com', None, '<h3>Plan</h3>')
+            self.assertEqual(resp.status_code, 404)
 
-    def test_no_email_when_both_failed(self):
-        """Should not send email when both avatar and plan fail."""
-        from app import check_and_send_email
 
-        with patch('app.get_db') as mock_db:
+class TestCachedAvatarCount(unittest.TestCase):
+    """Tests for the /check-email avatar count cache."""
+
+    def setUp(self):
+        from app import invalidate_avatar_count
+        invalidate_avatar_count()
+
+    def test_repeat_checks_reuse_cached_count(self):
+        """A second check within the TTL should not query the database."""
+        from app import get_cached_avatar_count
+
+        with patch('app.get_avatar_count', return_value=1) as mock_count:
+            self.assertEqual(get_cached_avatar_count('a@example.com'), 1)
+            self.assertEqual(get_cached_avatar_count('a@example.com'), 1)
+
+        mock_count.assert_called_once_with('a@example.com')
+
+    def test_invalidate_forces_fresh_count(self):
+        """Invalidating an email should make the next check hit the database."""
+        from app import get_cached_avatar_count, invalidate_avatar_count
+
+        with patch('app.get_avatar_count', side_effect=[1, 2]):
+            get_cached_avatar_count('a@example.com')
+            invalidate_avatar_count('a@example.com')
+            self.assertEqual(get_cached_avatar_count('a@example.com'), 2)
+
+
+class TestResponseCompression(unittest.TestCase):
+    """Tests for gzip compression of HTML/JSON responses."""
+
+    def test_large_html_is_gzipped(self):
+        """Large HTML pages should be gzipped for clients that accept it."""
+        import gzip
+        from app import app
+
+        page = '<p>response</p>' * 500
+        with patch('app.render_template', return_value=page):
+            resp = app.test_client().get('/', headers={'Accept-Encoding': 'gzip, deflate'})
+
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', resp.headers['Vary'])
+        self.assertEqual(gzip.decompress(resp.data).decode(), page)
+
+    def test_small_or_unaccepted_responses_untouched(self):
+        """Small bodies and clients without gzip support get the plain body."""
+        from app import app
+
+        with patch('app.render_template', return_value='<p>small</p>'):
+            small = app.test_client().get('/', headers={'Accept-Encoding': 'gzip'})
+        with patch('app.render_template', return_value='<p>response</p>' * 500):
+            plain = app.test_client().get('/')
+
+        self.assertNotIn('Content-Encoding', small.headers)
+        self.assertNotIn('Content-Encoding', plain.headers)
+
+    def test_streamed_response_untouched(self):
+        """Generator bodies must stay streamed instead of being buffered to gzip them."""
+        from flask import Response
+        from app import app, compress_response
+
+        chunks = ['<p>response</p>' * 100 for _ in range(5)]
+        resp = Response(iter(chunks), mimetype='text/html')
+        with app.test_request_context('/', headers={'Accept-Encoding': 'gzip'}):
+            result = compress_response(resp)
+
+        self.assertTrue(result.is_streamed)
+        self.assertNotIn('Content-Encoding', result.headers)
+
+
+class TestDatabasePool(unittest.TestCase):
+    """Tests for pooled database connections."""
+
+    def test_get_db_creates_pool_once(self):
+        """Connections should come from a single lazily created pool."""
+        import app
+
+        with patch.object(app, '_db_pool', None), \
+                patch('app.ThreadedConnectionPool') as mock_pool_cls:
+            first = app.get_db()
+            second = app.get_db()
+
+            mock_pool_cls.assert_called_once()
+            self.assertEqual(mock_pool_cls.call_args[0][:2], (app.PG_POOL_MIN, app.PG_POOL_MAX))
+            self.assertIs(first, mock_pool_cls.return_value.getconn.return_value)
+            self.assertIs(second, first)
+
+    def test_release_returns_connection_to_pool(self):
+        """release_db should hand the connection back instead of closing it."""
+        import app
+
+        mock_pool = MagicMock()
+        conn = MagicMock()
+        with patch.object(app, '_db_pool', mock_pool):
+            app.release_db(conn)
+
+        mock_pool.putconn.assert_called_once_with(conn)
+        conn.close.assert_not_called()
+
+    def test_db_conn_releases_connection(self):
+        """db_conn should hand the connection back once the block finishes."""
+        import app
+
+        with patch('app.get_db') as mock_db, patch('app.release_db') as mock_release:
+            with app.db_conn() as conn:
+                self.assertIs(conn, mock_db.return_value)
+
+        mock_release.assert_called_once_with(mock_db.return_value)
+        mock_db.return_value.rollback.assert_not_called()
+
+    def test_db_conn_rolls_back_and_releases_on_error(self):
+        """A failing block must not leak its checkout, even on a broken connection."""
+        import psycopg2
+        import app
+
+        with patch('app.get_db') as mock_db, patch('app.release_db') as mock_release:
+            mock_db.return_value.rollback.side_effect = psycopg2.InterfaceError('connection already closed')
+            with self.assertRaises(psycopg2.OperationalError):
+                with app.db_conn():
+                    raise psycopg2.OperationalError('server closed the connection')
+
+        mock_db.return_value.rollback.assert_called_once()
+        mock_release.assert_called_once_with(mock_db.return_value)
+
+    def test_pool_keeps_a_connection_per_concurrent_user(self):
+        """minconn should cover request threads and both job pools."""
+        import app
+
+        self.assertGreaterEqual(app.PG_POOL_MIN,
+                                app.WEB_THREADS + app.AVATAR_WORKERS + app.PLAN_WORKERS)
+        self.assertGreaterEqual(app.PG_POOL_MAX, app.PG_POOL_MIN)
+
+
+class TestAdminStats(unittest.TestCase):
+    """Tests for the admin dashboard statistics."""
+
+    def _render_admin(self, answer_counts):
+        from app import app
+
+        with patch('app.get_db') as mock_db, \
+                patch('app.ADMIN_PASSWORD', 'secret'), \
+                patch('app.render_template', return_value='ok') as mock_render:
+            mock_cursor = MagicMock()
+            mock_cursor.fetchall.side_effect = [[], [], answer_counts]
+            mock_db.return_value.cursor.return_value = mock_cursor
+
+            response = app.test_client().get('/admin', headers={
+                'Authorization': 'Basic ' + base64.b64encode(b'admin:secret').decode()
+            })
+
+        self.assertEqual(response.status_code, 200)
+        return mock_render.call_args[1]
+
+    def test_rating_stats_from_answer_counts(self):
+        """Rating stats should be built from the grouped answer counts."""
+        context = self._render_admin([
+            {'qid': 'rag', 'value': '7', 'count': 3},
+            {'qid': 'rag', 'value': '1', 'count': 1},
+            {'qid': 'rag', 'value': 'abc', 'count': 2},
+        ])
+
+        rag = context['stats']['rag']
+        self.assertEqual(rag['count'], 4)
+        self.assertEqual(rag['average'], 5.5)
+        self.assertEqual((rag['min'], rag['max']), (1, 7))
+        self.assertEqual(rag['distribution'][7], 3)
+        self.assertEqual(context['stats']['mcp']['count'], 0)
+
+    def test_responses_select_explicit_columns(self):
+        """Responses should be fetched with only the columns the page needs."""
+        from app import app
+
+        row = {'id': 1, 'email': 'a@example.com', 'data': {'rag': '5'}, 'submitted_at': None}
+        cur = MagicMock()
+        cur.fetchall.side_effect = [[row], [], []]
+
+        with patch('app.get_db') as mock_db, \
+                patch('app.ADMIN_PASSWORD', 'secret'), \
+                patch('app.render_template', return_value='ok') as mock_render:
+            mock_db.return_value.cursor.return_value = cur
+
+            app.test_client().get('/admin', headers={
+                'Authorization': 'Basic ' + base64.b64encode(b'admin:secret').decode()
+            })
+
+        query = cur.execute.call_args_list[0][0][0]
+        self.assertIn('FROM responses', query)
+        self.assertNotIn('*', query)
+        self.assertEqual(mock_render.call_args[1]['responses'], [row])
+
+    def test_multiple_choice_counts_known_options(self):
+        """Multiple-choice counts should ignore values that are not options."""
+        context = self._render_admin([
+            {'qid': 'ai_assistant_used', 'value': 'Yes', 'count': 5},
+            {'qid': 'ai_assistant_used', 'value': 'Maybe', 'count': 2},
+        ])
+
+        self.assertEqual(context['mc_stats']['ai_assistant_used'],
+                         {'Yes': 5, 'No': 0, 'Tried once': 0})
+
+
+class TestSubmit(unittest.TestCase):
+    """Tests for the survey submission route."""
+
+    def test_single_commit_before_jobs_start(self):
+        """Response, avatar and plan rows should commit together before jobs are queued."""
+        from app import app, AVATAR_EXECUTOR, PLAN_EXECUTOR
+
+        events = []
+        with patch('app.get_db') as mock_db, \
+                patch('app.get_avatar_count', return_value=0) as mock_count, \
+                patch('app.run_in_background', side_effect=lambda executor, fn, *a: events.append((executor, fn.__name__))), \
+                patch.dict('app._pending_sends', clear=True), \
+                patch('app.render_template', return_value='ok'):
             mock_cursor = MagicMock()
+            mock_cursor.fetchone.return_value = {'id': 1}
             mock_conn = MagicMock()
             mock_conn.cursor.return_value = mock_cursor
+            mock_conn.commit.side_effect = lambda: events.append('commit')
             mock_db.return_value = mock_conn
 
-            # Both failed
-            mock_cursor.fetchone.side_effect = [
-                {'id': '123', 'status': 'failed', 'image_data': None},
-                {'id': '456', 'status': 'failed', 'plan_content': None}
-            ]
+            resp = app.test_client().post('/submit', data={
+                'email': 'test@example.com',
+                'selfie_data': 'data:image/jpeg;base64,AAAA',
+                'wishlist_app': 'Jira',
+            })
+
+        self.assertEqual(resp.status_code, 200)
+        # The avatar cap is checked on the submission's own connection
+        mock_count.assert_called_once_with('test@example.com', mock_cursor)
+        mock_db.assert_called_once()
+        self.assertEqual(events, [
+            'commit',
+            (AVATAR_EXECUTOR, 'generate_avatar_async'),
+            (PLAN_EXECUTOR, 'generate_plan_async'),
+        ])
+
+
+class TestSubmitApi(unittest.TestCase):
+    """Tests for the JSON submission and status endpoints."""
+
+    def _mock_db(self, mock_db, fetchone):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = fetchone
+        mock_conn = MagicMock()
+        mock_conn.cursor.return_value = mock_cursor
+        mock_db.return_value = mock_conn
+
+    def test_api_submit_returns_202_with_status_url(self):
+        """The API should acknowledge with 202 and point at the avatar status."""
+        from app import app
+
+        with patch('app.get_db') as mock_db, \
+                patch('app.get_avatar_count', return_value=0), \
+                patch('app.run_in_background'), \
+                patch.dict('app._pending_sends', clear=True):
+            self._mock_db(mock_db, {'id': 7})
+
+            resp = app.test_client().post('/api/submit', data={
+                'email': 'test@example.com',
+                'selfie_data': 'data:image/jpeg;base64,AAAA',
+            })
+
+        self.assertEqual(resp.status_code, 202)
+        body = resp.get_json()
+        self.assertEqual(body['response_id'], 7)
+        self.assertIsNone(body['plan_id'])
+        self.assertEqual(body['status_url'], f"/api/avatar/{body['avatar_id']}/status")
+
+    def test_status_of_completed_avatar(self):
+        """A completed avatar should report where its image lives."""
+        from app import app
 
-            with patch('app.send_combined_email') as mock_send:
-                check_and_send_email(1, 'test@example.com')
-                mock_send.assert_not_called()
+        with patch('app.get_db') as mock_db:
+            self._mock_db(mock_db, {'status': 'completed', 'error_message': None})
 
+            resp = app.test_client().get('/api/avatar/12345678-1234-5678-1234-567812345678/status')
 
-class TestSendCombinedEmail(unittest.TestCase):
-    """Tests for send_combined_email function."""
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['image_url'],
+                         '/avatar/12345678-1234-5678-1234-567812345678/image.png')
 
-    def test_skips_when_no_resend_key(self):
-        """Should skip email when RESEND_API_KEY not set."""
-        from app import send_combined_email
+    def test_status_of_missing_avatar(self):
+        """An unknown avatar id should return 404."""
+        from app import app
 
-        with patch('app.RESEND_API_KEY', None):
-            with patch('app.resend') as mock_resend:
-                send_combined_email('test@example.com', '123', 'base64data', '<h3>Plan</h3>')
-                mock_resend.Emails.send.assert_not_called()
+        with patch('app.get_db') as mock_db:
+            self._mock_db(mock_db, None)
 
-    def test_avatar_only_subject(self):
-        """Should use avatar-only subject when no plan content."""
-        from app import send_combined_email
+            resp = app.test_client().get('/api/avatar/12345678-1234-5678-1234-567812345678/status')
 
-        with patch('app.RESEND_API_KEY', 'test-key'):
-            with patch('app.resend') as mock_resend:
-                send_combined_email('test@example.com', '123', 'base64data', None)
-                call_args = mock_resend.Emails.send.call_args[0][0]
-                self.assertEqual(call_args['subject'], 'Your Vibe Coding Wizard Avatar is Ready!')
+        self.assertEqual(resp.status_code, 404)
 
-    def test_plan_only_subject(self):
-        """Should use plan-only subject when no avatar."""
-        from app import send_combined_email
 
-        with patch('app.RESEND_API_KEY', 'test-key'):
-            with patch('app.resend') as mock_resend:
-                send_combined_email('test@example.com', None, None, '<h3>Plan</h3>')
-                call_args = mock_resend.Emails.send.call_args[0][0]
-                self.assertEqual(call_args['subject'], 'Your Vibe Coding Kickstart Plan is Ready!')
+class TestAnswerReaders(unittest.TestCase):
+    """Tests for the per-question form readers built from SURVEY_CONFIG."""
 
-    def test_combined_subject(self):
-        """Should use combined subject when both avatar and plan."""
-        from app import send_combined_email
+    def test_other_text_replaces_other_choice(self):
+        """Choosing 'Other' should record the free-text answer."""
+        from werkzeug.datastructures import MultiDict
+        from app import ANSWER_READERS
 
-        with patch('app.RESEND_API_KEY', 'test-key'):
-            with patch('app.resend') as mock_resend:
-                send_combined_email('test@example.com', '123', 'base64data', '<h3>Plan</h3>')
-                call_args = mock_resend.Emails.send.call_args[0][0]
-                self.assertEqual(call_args['subject'], 'Your Wizard Avatar & Vibe Coding Plan are Ready!')
+        form = MultiDict({'wishlist_app': '__other__', 'wishlist_app_other_text': '  ServiceNow '})
+        self.assertEqual(ANSWER_READERS['wishlist_app'](form), 'ServiceNow')
 
-    def test_includes_avatar_link(self):
-        """Should include avatar link in email when avatar_id provided."""
-        from app import send_combined_email
+    def test_wrong_multi_select_count_is_cleared(self):
+        """A multi-select with the wrong number of picks should be dropped."""
+        from werkzeug.datastructures import MultiDict
+        from app import ANSWER_READERS
 
-        with patch('app.RESEND_API_KEY', 'test-key'):
-            with patch('app.APP_URL', 'https://test.example.com'):
-                with patch('app.resend') as mock_resend:
-                    send_combined_email('test@example.com', 'abc-123', 'base64data', None)
-                    call_args = mock_resend.Emails.send.call_args[0][0]
-                    self.assertIn('https://test.example.com/avatar/abc-123', call_args['html'])
+        read_fuels = ANSWER_READERS['avatar_fuels']
+        self.assertEqual(read_fuels(MultiDict([('avatar_fuels', 'code'), ('avatar_fuels', 'coffee')])),
+                         ['code', 'coffee'])
+        self.assertEqual(read_fuels(MultiDict([('avatar_fuels', 'code')])), [])
 
-    def test_includes_plan_content(self):
-        """Should include plan content in email when provided."""
-        from app import send_combined_email
+    def test_duplicate_multi_select_picks_count_once(self):
+        """Repeated picks should collapse, keeping first-seen order, before the count check."""
+        from werkzeug.datastructures import MultiDict
+        from app import ANSWER_READERS
 
-        with patch('app.RESEND_API_KEY', 'test-key'):
-            with patch('app.resend') as mock_resend:
-                send_combined_email('test@example.com', None, None, '<h3>My Custom Plan</h3>')
-                call_args = mock_resend.Emails.send.call_args[0][0]
-                self.assertIn('<h3>My Custom Plan</h3>', call_args['html'])
+        read_fuels = ANSWER_READERS['avatar_fuels']
+        for picks, expected in [
+            (['code', 'code'], []),
+            (['coffee', 'code', 'coffee'], ['coffee', 'code']),
+        ]:
+            with self.subTest(picks=picks):
+                self.assertEqual(read_fuels(MultiDict([('avatar_fuels', p) for p in picks])), expected)
 
-    def test_embeds_avatar_as_cid_attachment(self):
-        """Should embed avatar image as CID attachment when avatar_data provided."""
-        from app import send_combined_email
+    def test_unknown_option_values_are_dropped(self):
+        """Values outside a question's options should not be stored."""
+        from werkzeug.datastructures import MultiDict
+        from app import ANSWER_READERS
 
-        with patch('app.RESEND_API_KEY', 'test-key'):
-            with patch('app.resend') as mock_resend:
-                send_combined_email('test@example.com', 'abc-123', 'base64imagedata', None)
-                call_args = mock_resend.Emails.send.call_args[0][0]
-                # Check that attachments include the avatar with CID
-                self.assertIn('attachments', call_args)
-                self.assertEqual(len(call_args['attachments']), 1)
-                self.assertEqual(call_args['attachments'][0]['content'], 'base64imagedata')
-                self.assertEqual(call_args['attachments'][0]['content_id'], 'avatar_image')
-                # Check that HTML references the CID
-                self.assertIn('cid:avatar_image', call_args['html'])
+        self.assertEqual(ANSWER_READERS['avatar_universe'](MultiDict({'avatar_universe': 'cyberpunk'})), 'cyberpunk')
+        self.assertEqual(ANSWER_READERS['avatar_universe'](MultiDict({'avatar_universe': 'mars'})), '')
+        self.assertEqual(ANSWER_READERS['avatar_fuels'](
+            MultiDict([('avatar_fuels', 'code'), ('avatar_fuels', 'hacking')])), [])
+
+    def test_every_question_has_a_reader(self):
+        """Every configured question should have a reader."""
+        from app import ANSWER_READERS, SURVEY_CONFIG
+
+        self.assertEqual(list(ANSWER_READERS), [q['id'] for q in SURVEY_CONFIG['questions']])
 
 
 class TestPreferenceExtraction(unittest.TestCase):
@@ -255,64 +901,39 @@ class TestPreferenceExtraction(unittest.TestCase):
 
     def test_extracts_valid_preferences(self):
         """Should extract preferences when all fields present."""
-        # This tests the logic that would be in submit()
-        responses = {
+        from app import extract_avatar_preferences
+
+        preferences = extract_avatar_preferences({
             'avatar_universe': 'cyberpunk',
-            'avatar_fuels': ['gaming', 'code', 'coffee'],
+            'avatar_fuels': ['gaming', 'code'],
             'avatar_element': 'lightning'
-        }
-
-        preferences = None
-        if (responses.get('avatar_universe') and
-            responses.get('avatar_fuels') and len(responses.get('avatar_fuels', [])) == 3 and
-            responses.get('avatar_element')):
-            preferences = {
-                'avatar_universe': responses['avatar_universe'],
-                'avatar_fuels': responses['avatar_fuels'],
-                'avatar_element': responses['avatar_element']
-            }
+        })
 
         self.assertIsNotNone(preferences)
         self.assertEqual(preferences['avatar_universe'], 'cyberpunk')
-        self.assertEqual(preferences['avatar_fuels'], ['gaming', 'code', 'coffee'])
+        self.assertEqual(preferences['avatar_fuels'], ['gaming', 'code'])
         self.assertEqual(preferences['avatar_element'], 'lightning')
 
     def test_no_preferences_when_missing_universe(self):
         """Should not extract preferences when universe missing."""
-        responses = {
-            'avatar_fuels': ['gaming', 'code', 'coffee'],
+        from app import extract_avatar_preferences
+
+        preferences = extract_avatar_preferences({
+            'avatar_fuels': ['gaming', 'code'],
             'avatar_element': 'lightning'
-        }
-
-        preferences = None
-        if (responses.get('avatar_universe') and
-            responses.get('avatar_fuels') and len(responses.get('avatar_fuels', [])) == 3 and
-            responses.get('avatar_element')):
-            preferences = {
-                'avatar_universe': responses['avatar_universe'],
-                'avatar_fuels': responses['avatar_fuels'],
-                'avatar_element': responses['avatar_element']
-            }
+        })
 
         self.assertIsNone(preferences)
 
     def test_no_preferences_when_wrong_fuels_count(self):
         """Should not extract preferences when fuels count is wrong."""
-        responses = {
+        from app import extract_avatar_preferences
+
+        preferences = extract_avatar_preferences({
             'avatar_universe': 'cyberpunk',
-            'avatar_fuels': ['gaming', 'code'],  # Only 2, need 3
+            'avatar_fuels': ['gaming', 'code', 'coffee'],  # 3, need exactly 2
             'avatar_element': 'lightning'
-        }
-
-        preferences = None
-        if (responses.get('avatar_universe') and
-            responses.get('avatar_fuels') and len(responses.get('avatar_fuels', [])) == 3 and
-            responses.get('avatar_element')):
-            preferences = {
-                'avatar_universe': responses['avatar_universe'],
-                'avatar_fuels': responses['avatar_fuels'],
-                'avatar_element': responses['avatar_element']
-            }
+        })
 
         self.assertIsNone(preferences)
 
@@ -320,62 +941,254 @@ class TestPreferenceExtraction(unittest.TestCase):
 class TestGeneratePlanAsync(unittest.TestCase):
     """Tests for generate_plan_async function."""
 
-    def test_updates_db_on_success(self):
+    @patch('app.task_finished')
+    @patch('app.cache_plan')
+    @patch('app.get_cached_plan', return_value=None)
+    @patch('app.get_db')
+    @patch('app.generate_vibe_plan', return_value=('<h3>Plan</h3>', True))
+    def test_updates_db_on_success(self, mock_gen, mock_db, mock_lookup, mock_cache, mock_finished):
         """Should update database with completed status on success."""
-        from app import generate_plan_async
+        generate_plan_async('plan-123', 'test@example.com', 'My app idea', 1)
+
+        # Verify the UPDATE was called with completed status
+        update_call = mock_db.return_value.cursor.return_value.execute.call_args_list[0]
+        self.assertEqual(update_call[0][1][0], 'completed')
+
+    @patch('app.task_finished')
+    @patch('app.cache_plan')
+    @patch('app.get_cached_plan', return_value=None)
+    @patch('app.get_db')
+    @patch('app.generate_vibe_plan', return_value=('Error message', False))
+    def test_failure_log_names_plan(self, mock_gen, mock_db, mock_lookup, mock_cache, mock_finished):
+        """Failures should be traceable to their plan id at the default log level."""
+        with self.assertLogs('app', level='WARNING') as logs:
+            generate_plan_async('plan-123', 'test@example.com', 'My app idea', 1)
+
+        self.assertIn('plan_id=plan-123', logs.output[0])
+
+    @patch('app.task_finished')
+    @patch('app.cache_plan')
+    @patch('app.get_cached_plan', return_value=None)
+    @patch('app.get_db')
+    @patch('app.generate_vibe_plan', return_value=('Error message', False))
+    def test_updates_db_on_failure(self, mock_gen, mock_db, mock_lookup, mock_cache, mock_finished):
+        """Should update database with failed status on failure."""
+        generate_plan_async('plan-123', 'test@example.com', 'My app idea', 1)
+
+        # Verify the UPDATE was called with failed status
+        update_call = mock_db.return_value.cursor.return_value.execute.call_args_list[0]
+        self.assertEqual(update_call[0][1][0], 'failed')
+        mock_finished.assert_called_once_with(1, 'test@example.com', 'plan', None)
+
+    @patch('app.task_finished')
+    @patch('app.cache_plan')
+    @patch('app.get_cached_plan', return_value=None)
+    @patch('app.get_db')
+    @patch('app.generate_vibe_plan', return_value=('<h3>Plan</h3>', True))
+    def test_reports_result_for_email(self, mock_gen, mock_db, mock_lookup, mock_cache, mock_finished):
+        """Should hand the finished plan to the email coordination."""
+        generate_plan_async('plan-123', 'test@example.com', 'My app idea', 1)
+
+        mock_finished.assert_called_once_with(1, 'test@example.com', 'plan', '<h3>Plan</h3>')
+
+    @patch('app.task_finished')
+    @patch('app.cache_plan')
+    @patch('app.get_cached_plan', return_value='<h3>Cached</h3>')
+    @patch('app.get_db')
+    @patch('app.generate_vibe_plan')
+    def test_uses_cached_plan_without_calling_claude(self, mock_gen, mock_db, mock_lookup, mock_cache,
+                                                     mock_finished):
+        """Should reuse a cached plan for a repeated custom input."""
+        generate_plan_async('plan-123', 'test@example.com', 'My app idea', 1)
+
+        mock_gen.assert_not_called()
+        mock_cache.assert_not_called()
+        update_call = mock_db.return_value.cursor.return_value.execute.call_args_list[0]
+        self.assertEqual(update_call[0][1], ('completed', '<h3>Cached</h3>', None, 'plan-123'))
+
+    @patch('app.task_finished')
+    @patch('app.cache_plan')
+    @patch('app.get_cached_plan', return_value=None)
+    @patch('app.get_db')
+    @patch('app.generate_vibe_plan', return_value=('<h3>Plan</h3>', True))
+    def test_caches_successful_plan(self, mock_gen, mock_db, mock_lookup, mock_cache, mock_finished):
+        """Should store a freshly generated plan in the cache."""
+        generate_plan_async('plan-123', 'test@example.com', 'My app idea', 1)
+
+        # Written on the status-update cursor, committed once
+        mock_conn = mock_db.return_value
+        mock_cache.assert_called_once_with(mock_conn.cursor.return_value,
+                                           'My app idea', '<h3>Plan</h3>')
+        mock_conn.commit.assert_called_once()
+
+    @patch('app.task_finished')
+    @patch('app.get_cached_plan')
+    @patch('app.get_db')
+    @patch('app.generate_vibe_plan')
+    def test_uses_pregenerated_plan_for_predefined_option(self, mock_gen, mock_db, mock_lookup, mock_finished):
+        """Should use the pre-generated plan for a predefined radio option."""
+        option = 'Email & Calendar (Outlook, Gmail)'
+        generate_plan_async('plan-123', 'test@example.com', option, 1)
+
+        mock_gen.assert_not_called()
+        mock_lookup.assert_not_called()
+        plan_content = mock_db.return_value.cursor.return_value.execute.call_args_list[0][0][1][1]
+        self.assertEqual(plan_content, get_pregenerated_plan(option))
+        self.assertTrue(plan_content.lstrip().startswith('<h3>The Vision</h3>'))
 
-        with patch('app.generate_vibe_plan') as mock_gen:
-            mock_gen.return_value = ('<h3>Plan</h3>', True)
+    @patch('app.task_finished')
+    @patch('app.get_cached_plan')
+    @patch('app.get_db')
+    @patch('app.generate_vibe_plan')
+    def test_uses_pregenerated_plan_for_matching_custom_input(self, mock_gen, mock_db, mock_lookup,
+                                                              mock_finished):
+        """A free-text answer that is a known product name should reuse that plan."""
+        generate_plan_async('plan-123', 'test@example.com', 'Jira', 1)
 
-            with patch('app.get_db') as mock_db:
-                mock_cursor = MagicMock()
-                mock_conn = MagicMock()
-                mock_conn.cursor.return_value = mock_cursor
-                mock_db.return_value = mock_conn
+        mock_gen.assert_not_called()
+        mock_lookup.assert_not_called()
+        plan_content = mock_db.return_value.cursor.return_value.execute.call_args_list[0][0][1][1]
+        self.assertIn('<h3>The Vision: Jira</h3>', plan_content)
+        self.assertIn('<h3>Tips for Success</h3>', plan_content)
 
-                with patch('app.check_and_send_email'):
-                    generate_plan_async('plan-123', 'test@example.com', 'My app idea', 1)
 
-                # Verify the UPDATE was called with completed status
-                update_call = mock_cursor.execute.call_args_list[0]
-                self.assertIn('completed', update_call[0][0])
+class TestMatchPregeneratedPlan(unittest.TestCase):
+    """Tests for the product-name router from free text to pre-generated plans."""
+
+    def test_products_point_at_pregenerated_plans(self):
+        """Every product name should point at an existing pre-generated plan."""
+        from app import PLAN_PRODUCTS, PREGENERATED_PLANS
+
+        self.assertLessEqual(set(PLAN_PRODUCTS.values()), set(PREGENERATED_PLANS))
+
+    def test_matches_exact_product_name(self):
+        """An answer that is just a product name should map to its option."""
+        from app import match_pregenerated_plan
+
+        self.assertEqual(match_pregenerated_plan('Outlook'), 'Email & Calendar (Outlook, Gmail)')
+        self.assertEqual(match_pregenerated_plan('  google   Sheets. '),
+                         'Spreadsheets & Reports (Excel, Google Sheets)')
+
+    def test_longer_answers_return_none(self):
+        """Answers that only mention a product or generic term should go to Claude."""
+        from app import match_pregenerated_plan
+
+        self.assertIsNone(match_pregenerated_plan('ServiceNow email notifications'))
+        self.assertIsNone(match_pregenerated_plan('my Outlook inbox'))
+        self.assertIsNone(match_pregenerated_plan('Jira tickets from email'))
+        self.assertIsNone(match_pregenerated_plan('firewall'))
+
+    def test_unknown_product_returns_none(self):
+        """Unrecognised products should fall through to Claude."""
+        from app import match_pregenerated_plan
+
+        self.assertIsNone(match_pregenerated_plan('ServiceNow'))
+        self.assertIsNone(match_pregenerated_plan('password manager'))
+
+
+class TestPersonalizePlan(unittest.TestCase):
+    """Tests for naming the user's product in a reused plan."""
+
+    def test_names_product_in_headings(self):
+        """The product-specific section headings should carry the user's product."""
+        from app import personalize_plan
+
+        plan = personalize_plan(get_pregenerated_plan('Project Management (Jira, Trello, Asana)'), 'jira')
+
+        self.assertIn('<h3>The Vision: jira</h3>', plan)
+        self.assertIn('<h3>Vibe Coding Approach: jira</h3>', plan)
+        self.assertIn('<h3>Tips for Success</h3>', plan)
+
+    def test_escapes_product_name(self):
+        """User text is HTML-escaped since plan content is rendered unescaped."""
+        from app import personalize_plan
+
+        plan = personalize_plan('<h3>The Vision</h3>', '<b>Jira</b>')
+
+        self.assertEqual(plan, '<h3>The Vision: &lt;b&gt;Jira&lt;/b&gt;</h3>')
 
-    def test_updates_db_on_failure(self):
-        """Should update database with failed status on failure."""
-        from app import generate_plan_async
 
-        with patch('app.generate_vibe_plan') as mock_gen:
-            mock_gen.return_value = ('Error message', False)
+class TestPlanCacheKey(unittest.TestCase):
+    """Tests for plan_cache_key normalization."""
 
-            with patch('app.get_db') as mock_db:
-                mock_cursor = MagicMock()
-                mock_conn = MagicMock()
-                mock_conn.cursor.return_value = mock_cursor
-                mock_db.return_value = mock_conn
+    def test_ignores_case_and_whitespace(self):
+        """Inputs differing only in case/spacing should share a key."""
+        from app import plan_cache_key
 
-                with patch('app.check_and_send_email'):
-                    generate_plan_async('plan-123', 'test@example.com', 'My app idea', 1)
+        self.assertEqual(plan_cache_key('  ServiceNow   tickets '), plan_cache_key('servicenow tickets'))
 
-                # Verify the UPDATE was called with failed status
-                update_call = mock_cursor.execute.call_args_list[0]
-                self.assertIn('failed', update_call[0][0])
+    def test_distinct_inputs_differ(self):
+        """Different inputs should produce different keys."""
+        from app import plan_cache_key
 
-    def test_calls_check_and_send_email(self):
-        """Should call check_and_send_email after completion."""
-        from app import generate_plan_async
+        self.assertNotEqual(plan_cache_key('ServiceNow'), plan_cache_key('Jira'))
 
-        with patch('app.generate_vibe_plan') as mock_gen:
-            mock_gen.return_value = ('<h3>Plan</h3>', True)
 
-            with patch('app.get_db') as mock_db:
-                mock_cursor = MagicMock()
-                mock_conn = MagicMock()
-                mock_conn.cursor.return_value = mock_cursor
-                mock_db.return_value = mock_conn
+class TestDecodeImageData(unittest.TestCase):
+    """Tests for decode_image_data."""
+
+    def test_decodes_data_url(self):
+        """Should strip the data URL header before decoding."""
+        from app import decode_image_data
+
+        self.assertEqual(decode_image_data('data:image/jpeg;base64,aGVsbG8='), b'hello')
+
+    def test_decodes_bare_base64(self):
+        """Should decode base64 without a data URL header."""
+        from app import decode_image_data
+
+        self.assertEqual(decode_image_data('aGVsbG8='), b'hello')
+
+
+class TestGeminiCircuitBreaker(unittest.TestCase):
+    """Tests for the Gemini circuit breaker."""
+
+    def setUp(self):
+        import app
+        app._gemini_breaker.update(failures=0, open_until=0.0)
+
+    tearDown = setUp
+
+    def test_opens_after_consecutive_overloads(self):
+        """Breaker should open once the overload threshold is reached."""
+        from app import record_gemini_result, gemini_breaker_open, GEMINI_BREAKER_THRESHOLD
+
+        for _ in range(GEMINI_BREAKER_THRESHOLD - 1):
+            record_gemini_result(overloaded=True)
+        self.assertFalse(gemini_breaker_open())
+
+        record_gemini_result(overloaded=True)
+        self.assertTrue(gemini_breaker_open())
+
+    def test_success_resets_failure_count(self):
+        """A successful call should reset the consecutive overload count."""
+        from app import record_gemini_result, gemini_breaker_open, GEMINI_BREAKER_THRESHOLD
+
+        for _ in range(GEMINI_BREAKER_THRESHOLD - 1):
+            record_gemini_result(overloaded=True)
+        record_gemini_result(overloaded=False)
+        record_gemini_result(overloaded=True)
+
+        self.assertFalse(gemini_breaker_open())
+
+    def test_avatar_fails_fast_when_open(self):
+        """Avatar generation should skip Gemini and mark failure while open."""
+        from app import generate_avatar_async
+
+        with patch('app.gemini_breaker_open', return_value=True), \
+                patch('app.get_gemini_client') as mock_get_client, \
+                patch('app.get_db') as mock_db, \
+                patch('app.check_and_send_email'):
+            mock_cursor = MagicMock()
+            mock_conn = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            mock_db.return_value = mock_conn
+
+            generate_avatar_async('avatar-1', 'test@example.com', 'data:image/jpeg;base64,AAAA', 1)
 
-                with patch('app.check_and_send_email') as mock_check:
-                    generate_plan_async('plan-123', 'test@example.com', 'My app idea', 1)
-                    mock_check.assert_called_once_with(1, 'test@example.com')
+            mock_get_client.return_value.models.generate_content.assert_not_called()
+            update_call = mock_cursor.execute.call_args_list[0]
+            self.assertIn('failed', update_call[0][0])
 
 
 if __name__ == '__main__':
@@ -1,4 +1,5 @@
 """Stage 2 Survey Preferences Tests"""
+import pytest
 
 
 def test_survey_config_has_preference_questions():
@@ -14,83 +15,115 @@ def test_survey_config_has_preference_questions():
 
 def test_avatar_universe_options():
     """Verify avatar_universe has 10 options."""
-    from app import SURVEY_CONFIG
+    from app import SURVEY_QUESTIONS_BY_ID
 
-    q = next(q for q in SURVEY_CONFIG['questions'] if q['id'] == 'avatar_universe')
+    q = SURVEY_QUESTIONS_BY_ID['avatar_universe']
     assert len(q['options']) == 10
     assert q['type'] == 'single_select'
 
 
 def test_avatar_fuels_options():
-    """Verify avatar_fuels has 10 options and select_count of 3."""
-    from app import SURVEY_CONFIG
+    """Verify avatar_fuels has 10 options and select_count of 2."""
+    from app import SURVEY_QUESTIONS_BY_ID
 
-    q = next(q for q in SURVEY_CONFIG['questions'] if q['id'] == 'avatar_fuels')
+    q = SURVEY_QUESTIONS_BY_ID['avatar_fuels']
     assert len(q['options']) == 10
     assert q['type'] == 'multi_select_exact'
-    assert q['select_count'] == 3
+    assert q['select_count'] == 2
 
 
 def test_avatar_element_options():
     """Verify avatar_element has 8 options."""
-    from app import SURVEY_CONFIG
+    from app import SURVEY_QUESTIONS_BY_ID
 
-    q = next(q for q in SURVEY_CONFIG['questions'] if q['id'] == 'avatar_element')
+    q = SURVEY_QUESTIONS_BY_ID['avatar_element']
     assert len(q['options']) == 8
     assert q['type'] == 'single_select'
 
 
 def test_preference_questions_are_optional():
     """Verify all preference questions are not required."""
-    from app import SURVEY_CONFIG
+    from app import SURVEY_QUESTIONS_BY_ID
 
     preference_ids = ['avatar_universe', 'avatar_fuels', 'avatar_element']
     for qid in preference_ids:
-        q = next(q for q in SURVEY_CONFIG['questions'] if q['id'] == qid)
+        q = SURVEY_QUESTIONS_BY_ID[qid]
         assert q.get('required', False) is False, f"{qid} should not be required"
 
 
 def test_preference_questions_have_descriptions():
     """Verify preference questions have descriptions."""
-    from app import SURVEY_CONFIG
+    from app import SURVEY_QUESTIONS_BY_ID
 
     preference_ids = ['avatar_universe', 'avatar_fuels', 'avatar_element']
     for qid in preference_ids:
-        q = next(q for q in SURVEY_CONFIG['questions'] if q['id'] == qid)
+        q = SURVEY_QUESTIONS_BY_ID[qid]
         assert 'description' in q, f"{qid} should have a description"
         assert len(q['description']) > 0, f"{qid} description should not be empty"
 
 
 def test_avatar_universe_valid_values():
     """Verify avatar_universe has the correct option values."""
-    from app import SURVEY_CONFIG
+    from app import SURVEY_OPTION_VALUES, SURVEY_QUESTIONS_BY_ID
 
-    q = next(q for q in SURVEY_CONFIG['questions'] if q['id'] == 'avatar_universe')
+    q = SURVEY_QUESTIONS_BY_ID['avatar_universe']
     values = [opt['value'] for opt in q['options']]
 
     expected = ['scifi', 'fantasy', 'cyberpunk', 'retro', 'nature',
                 'steampunk', 'cosmic', 'postapoc', 'noir', 'underwater']
     assert values == expected
+    assert SURVEY_OPTION_VALUES['avatar_universe'] == frozenset(expected)
 
 
 def test_avatar_fuels_valid_values():
     """Verify avatar_fuels has the correct option values."""
-    from app import SURVEY_CONFIG
+    from app import SURVEY_OPTION_VALUES, SURVEY_QUESTIONS_BY_ID
 
-    q = next(q for q in SURVEY_CONFIG['questions'] if q['id'] == 'avatar_fuels')
+    q = SURVEY_QUESTIONS_BY_ID['avatar_fuels']
     values = [opt['value'] for opt in q['options']]
 
     expected = ['gaming', 'music', 'sports', 'coffee', 'code',
                 'movies', 'travel', 'art', 'fitness', 'books']
     assert values == expected
+    assert SURVEY_OPTION_VALUES['avatar_fuels'] == frozenset(expected)
 
 
 def test_avatar_element_valid_values():
     """Verify avatar_element has the correct option values."""
-    from app import SURVEY_CONFIG
+    from app import SURVEY_OPTION_VALUES, SURVEY_QUESTIONS_BY_ID
 
-    q = next(q for q in SURVEY_CONFIG['questions'] if q['id'] == 'avatar_element')
+    q = SURVEY_QUESTIONS_BY_ID['avatar_element']
     values = [opt['value'] for opt in q['options']]
 
     expected = ['fire', 'lightning', 'ice', 'earth', 'digital', 'shadow', 'cosmic', 'crystal']
     assert values == expected
+    assert SURVEY_OPTION_VALUES['avatar_element'] == frozenset(expected)
+
+
+def test_questions_by_id_indexes_config():
+    """Verify SURVEY_QUESTIONS_BY_ID points at the SURVEY_CONFIG question dicts."""
+    from app import SURVEY_CONFIG, SURVEY_QUESTIONS_BY_ID
+
+    for q in SURVEY_CONFIG['questions']:
+        assert SURVEY_QUESTIONS_BY_ID[q['id']] is q
+
+
+def test_option_values_cover_preference_questions():
+    """Verify SURVEY_OPTION_VALUES holds the accepted values for option questions."""
+    from app import SURVEY_OPTION_VALUES
+
+    assert 'cyberpunk' in SURVEY_OPTION_VALUES['avatar_universe']
+    assert 'lightning' in SURVEY_OPTION_VALUES['avatar_element']
+    assert SURVEY_OPTION_VALUES['ai_assistant_used'] == frozenset(['Yes', 'No', 'Tried once'])
+    assert 'wishlist_app' not in SURVEY_OPTION_VALUES
+
+
+def test_survey_config_is_read_only():
+    """Verify SURVEY_CONFIG cannot be mutated by request handlers."""
+    from app import SURVEY_CONFIG, SURVEY_QUESTIONS_BY_ID
+
+    with pytest.raises(TypeError):
+        SURVEY_CONFIG['title'] = 'Changed'
+    with pytest.raises(TypeError):
+        SURVEY_QUESTIONS_BY_ID['avatar_fuels']['select_count'] = 5
+    assert isinstance(SURVEY_CONFIG['questions'], tuple)